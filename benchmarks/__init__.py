@@ -0,0 +1,8 @@
+"""
+Benchmarks of the report pipeline on synthetic Cloudability data.
+
+Run them with `make benchmark` or `python -m benchmarks.run --help`.
+
+:license: AGPL v3, see LICENSE for more details
+:copyright: 2022 Liquid Reply GmbH
+"""
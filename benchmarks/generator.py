@@ -0,0 +1,260 @@
+"""
+Module that generates synthetic Cloudability API payloads for benchmarks.
+
+The payloads have the shape of the responses of the accounts, amortized
+cost and rightsizing APIs, see tests/test_data for real examples. All
+values are drawn from a seeded random generator, so the same seed and
+sizes always create the same scenario.
+
+Example usage:
+```
+scenario = generate_scenario(accounts=100, projects=10, records=5000, seed=1)
+product_data = ProductData("ec2", scenario.products["ec2"])
+```
+
+:license: AGPL v3, see LICENSE for more details
+:copyright: 2022 Liquid Reply GmbH
+"""
+import random
+import pandas as pd
+
+from finops_report_automation.account_mapping import AccountMapping
+
+PRODUCTS = ["ec2", "ebs", "s3", "rds"]
+REGIONS = ["eu-central-1", "eu-west-1", "us-east-1", "us-west-2"]
+INSTANCE_TYPES = ["t3.micro", "t3.large", "m5.large", "m5.2xlarge", "c5.xlarge", "r5.4xlarge", "p3.2xlarge"]
+DATABASE_TYPES = ["db.t3.medium", "db.m5.large", "db.r5.xlarge", "db.r5.4xlarge"]
+DATABASE_ENGINES = ["mysql", "postgres", "aurora-mysql", "aurora-postgresql"]
+VOLUME_TYPES = ["gp2", "gp3", "io1", "st1", "sc1"]
+STORAGE_CLASSES = ["STANDARD", "STANDARD_IA", "INTELLIGENT_TIERING", "GLACIER"]
+# Share of the resources with a termination instead of a rightsizing recommendation
+TERMINATE_RATIO = 0.2
+# Rightsizing recommendations of a resource, ordered by preference
+MAX_OPTIONS = 3
+
+
+class Scenario:
+    """
+    Synthetic API responses of one run: the accounts, the amortized cost,
+    the account mapping and the rightsizing records of every product.
+    """
+    def __init__(self, accounts: list, amortized_cost: dict, mapping: AccountMapping,
+                 products: dict) -> None:
+        self.accounts = accounts
+        self.amortized_cost = amortized_cost
+        self.mapping = mapping
+        self.products = products
+
+    def __str__(self):
+        records = {name: len(records) for name, records in self.products.items()}
+        return (f"{len(self.accounts)} accounts, {len(self.mapping.project_accounts)} projects, "
+                f"records: {records}")
+
+
+def generate_account_ids(rng: random.Random, count: int) -> list:
+    """Unique 12 digit AWS account ids"""
+    return [str(account_id) for account_id in rng.sample(range(10**11, 10**12), count)]
+
+
+def generate_accounts(rng: random.Random, account_ids: list) -> list:
+    """Records of the accounts API"""
+    return [
+        {
+            "id": account_id,
+            "vendorAccountName": f"account-{index:05d}",
+            "vendorAccountId": account_id,
+            "vendorKey": "aws",
+            "verification": {"state": "verified"},
+            "authorization": {"type": "aws_role", "roleName": "CloudabilityRole"},
+            "parentAccountId": "987654321098",
+        }
+        for index, account_id in enumerate(account_ids)
+    ]
+
+
+def generate_amortized_cost(rng: random.Random, account_ids: list) -> dict:
+    """
+    Response of the amortized cost API. Like the real API, the account ids
+    are written with dashes.
+    """
+    rows = []
+    for account_id in account_ids:
+        total = round(rng.uniform(500, 250000), 2)
+        rows.append({
+            "dimensions": [f"{account_id[:4]}-{account_id[4:8]}-{account_id[8:]}"],
+            "metrics": [{
+                "count": str(rng.randint(100, 100000)),
+                "max": str(round(total / rng.randint(5, 50), 2)),
+                "min": str(round(-rng.uniform(0, 1000), 6)),
+                "sum": str(total),
+            }],
+        })
+    return {"rows": rows}
+
+
+def generate_mapping(rng: random.Random, account_ids: list, projects: int) -> AccountMapping:
+    """
+    Account mapping of the projects. Every project has at least one account,
+    the other accounts are spread randomly.
+    """
+    names = [f"project-{index:04d}" for index in range(projects)]
+    assigned = names + [rng.choice(names) for _ in range(len(account_ids) - projects)]
+    rng.shuffle(assigned)
+    df = pd.DataFrame({"projectName": assigned, "vendorAccountId": account_ids})
+    return AccountMapping(df.sort_values("projectName", kind="stable", ignore_index=True))
+
+
+def savings(rng: random.Random, total_spend: float) -> float:
+    # Most recommendations are small, a few are worth a lot
+    return round(min(total_spend, 50 + rng.paretovariate(1.5) * 40), 2)
+
+
+def recommendation_options(rng: random.Random, total_spend: float, option) -> list:
+    """
+    Recommendations of a single resource. Terminations have a single
+    recommendation, rightsizings one to MAX_OPTIONS options with
+    decreasing savings.
+    """
+    if rng.random() < TERMINATE_RATIO:
+        return [{
+            "action": "Terminate",
+            "preferenceOrder": 1,
+            "risk": 0,
+            "savingsPct": 100,
+            "savings": total_spend,
+        }]
+    best = savings(rng, total_spend)
+    options = []
+    for rank in range(1, rng.randint(1, MAX_OPTIONS) + 1):
+        value = round(best / rank, 2)
+        options.append({
+            "action": "Rightsize",
+            "preferenceOrder": rank,
+            "rank": rank,
+            "risk": rng.randint(0, 3),
+            "savingsPct": round(100 * value / total_spend),
+            "savings": value,
+            **option(),
+        })
+    return options
+
+
+def base_record(rng: random.Random, product: str, index: int, account_id: str) -> dict:
+    region = rng.choice(REGIONS)
+    name = f"{product}-{index:07d}"
+    return {
+        "service": f"{product}-recs",
+        "name": name,
+        "resourceIdentifier": name,
+        "vendorAccountId": account_id,
+        "provider": "NATIVE",
+        "region": region,
+        "availabilityZone": f"{region}{rng.choice('abc')}",
+        "currencyCode": "USD",
+        "totalSpend": round(rng.uniform(60, 5000), 2),
+        "idle": rng.randint(0, 100),
+        "lastSeen": "2022-04-10T23:00:00Z",
+        "tagMappings": [],
+    }
+
+
+def generate_ec2_record(rng: random.Random, index: int, account_id: str) -> dict:
+    record = base_record(rng, "ec2", index, account_id)
+    record.update({
+        "os": rng.choice(["Linux", "Windows"]),
+        "nodeType": rng.choice(INSTANCE_TYPES),
+        "unitPrice": round(rng.uniform(0.01, 3), 3),
+        "hoursRunning": 240,
+    })
+    record["recommendations"] = recommendation_options(
+        rng, record["totalSpend"], lambda: {"nodeType": rng.choice(INSTANCE_TYPES)})
+    return record
+
+
+def generate_ebs_record(rng: random.Random, index: int, account_id: str) -> dict:
+    record = base_record(rng, "ebs", index, account_id)
+    record.update({
+        "volumeType": rng.choice(VOLUME_TYPES),
+        "state": rng.choice(["Attached", "Unattached"]),
+        "volumeSize": rng.choice([8, 100, 500, 1000, 5000]),
+        "unitPrice": round(rng.uniform(0.01, 0.2), 3),
+    })
+    record["recommendations"] = recommendation_options(
+        rng, record["totalSpend"], lambda: {"volumeType": rng.choice(VOLUME_TYPES)})
+    return record
+
+
+def generate_s3_record(rng: random.Random, index: int, account_id: str) -> dict:
+    record = base_record(rng, "s3", index, account_id)
+    record.update({
+        "resourceType": rng.choice(STORAGE_CLASSES),
+        "bucketSizeBytes": rng.randint(10**6, 10**14),
+        "numberOfObjects": rng.randint(1, 10**7),
+    })
+    record["recommendations"] = recommendation_options(
+        rng, record["totalSpend"], lambda: {"resourceType": rng.choice(STORAGE_CLASSES)})
+    return record
+
+
+def generate_rds_record(rng: random.Random, index: int, account_id: str) -> dict:
+    """
+    RDS records have their savings in topSavings and separate storage
+    recommendations, which are often missing.
+    """
+    record = base_record(rng, "rds", index, account_id)
+    recommendations = recommendation_options(
+        rng, record["totalSpend"], lambda: {"nodeType": rng.choice(DATABASE_TYPES)})
+    record.update({
+        "clusterIdentifier": f"cluster-{index // 2:07d}",
+        "clusterRole": rng.choice(["writer", "reader"]),
+        "databaseEngine": rng.choice(DATABASE_ENGINES),
+        "nodeType": rng.choice(DATABASE_TYPES),
+        "storageType": rng.choice(["gp2", "io1", "aurora"]),
+        "unitPrice": round(rng.uniform(0.05, 5), 3),
+        "topSavings": recommendations[0]["savings"],
+        "recommendations": recommendations,
+        "storageRecommendations": [],
+    })
+    if rng.random() < 0.5:
+        record["storageRecommendations"].append({
+            "action": rng.choice(["Rightsize", "Terminate"]),
+            "storageType": "gp3",
+        })
+    return record
+
+
+RECORD_GENERATORS = {
+    "ec2": generate_ec2_record,
+    "ebs": generate_ebs_record,
+    "s3": generate_s3_record,
+    "rds": generate_rds_record,
+}
+
+
+def generate_records(rng: random.Random, product: str, count: int, account_ids: list) -> list:
+    """
+    Records of the rightsizing API of a product. Some accounts have many
+    more resources than others, like in real organizations.
+    """
+    weights = [rng.paretovariate(1.2) for _ in account_ids]
+    owners = rng.choices(account_ids, weights=weights, k=count)
+    generate_record = RECORD_GENERATORS[product]
+    return [generate_record(rng, index, account_id) for index, account_id in enumerate(owners)]
+
+
+def generate_scenario(accounts: int, projects: int, records: int, seed: int = 0,
+                      products: list = PRODUCTS) -> Scenario:
+    """
+    Generate all API responses of a run with the given number of accounts,
+    projects and records per product.
+    """
+    if projects > accounts:
+        raise ValueError(f"{projects} projects need at least as many accounts, got {accounts}")
+    rng = random.Random(seed)
+    account_ids = generate_account_ids(rng, accounts)
+    return Scenario(
+        generate_accounts(rng, account_ids),
+        generate_amortized_cost(rng, account_ids),
+        generate_mapping(rng, account_ids, projects),
+        {product: generate_records(rng, product, records, account_ids) for product in products},
+    )
@@ -0,0 +1,206 @@
+"""
+Benchmark of the stages of the report pipeline on synthetic data.
+
+For every size of the sweep a scenario is generated, see generator.py, and
+the stages of main() run on it without API, S3 or disk access:
+
+- normalize: ProductData of every product, flattening the API records
+- create_projects: the amortized costs and the projects of the mapping
+- resources: Resource.json_to_dataframe of every product and project
+- create_summary: Project.create_summary and Project.sum_all_accounts
+- write_reports_<backend>: the excel reports of all projects, in memory
+- cross_project_<backend>: the cross project overview, in memory
+
+The timings are written as json, together with the commit and the library
+versions, so runs of different commits can be compared.
+
+Example usage:
+```
+python -m benchmarks.run --sizes small,medium --output results.json
+python -m benchmarks.run --sizes 500:50:20000 --repeat 5
+```
+
+:license: AGPL v3, see LICENSE for more details
+:copyright: 2022 Liquid Reply GmbH
+"""
+import argparse
+import json
+import logging
+import platform
+import subprocess
+import time
+from datetime import datetime, timezone
+from functools import partial
+
+import openpyxl
+import pandas as pd
+
+from finops_report_automation.logger import create_logger
+from finops_report_automation.project import (
+    EXCEL_BACKENDS,
+    create_cross_project_overview,
+    create_projects,
+    save_report,
+)
+from finops_report_automation.resource import ProductData, create_account_directory
+from .generator import generate_scenario
+
+# accounts, projects and records per product
+SIZES = {
+    "tiny": (10, 2, 100),
+    "small": (50, 5, 1000),
+    "medium": (200, 20, 10000),
+    "large": (1000, 100, 50000),
+}
+DEFAULT_SIZES = "tiny,small,medium"
+RESULTS_FILE = "benchmark_results.json"
+
+
+def parse_size(size: str) -> tuple:
+    """
+    Sizes are either one of SIZES or accounts:projects:records,
+    e.g. 500:50:20000
+    """
+    if size in SIZES:
+        return (size, *SIZES[size])
+    try:
+        accounts, projects, records = [int(value) for value in size.split(":")]
+    except ValueError:
+        raise ValueError(
+            f"Unknown size {size}, expected one of {list(SIZES)} or accounts:projects:records")
+    return size, accounts, projects, records
+
+
+class StageTimer:
+    """Collects the durations of the stages over all repetitions"""
+    def __init__(self) -> None:
+        self.runs = {}
+
+    def __call__(self, stage: str, function, *args, **kwargs):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        self.runs.setdefault(stage, []).append(time.perf_counter() - start)
+        return result
+
+    def results(self) -> dict:
+        """The fastest run of every stage and all runs, in seconds"""
+        return {
+            stage: {"best": min(runs), "runs": runs}
+            for stage, runs in self.runs.items()
+        }
+
+
+def run_pipeline(scenario, timer: StageTimer, backends: list) -> dict:
+    """
+    Run all stages once on the scenario.
+    Returns the number of normalized rows of every product.
+    """
+    product_data = timer("normalize", lambda: {
+        product: ProductData(product, records)
+        for product, records in scenario.products.items()
+    })
+    projects = timer("create_projects", create_projects, scenario.amortized_cost, scenario.mapping)
+
+    def append_products():
+        account_directory = create_account_directory(scenario.accounts)
+        for product in scenario.products:
+            for project in projects:
+                project.append_product(product_data[product], account_directory)
+    timer("resources", append_products)
+
+    def summarize():
+        for project in projects:
+            project.create_summary()
+            project.sum_all_accounts()
+    timer("create_summary", summarize)
+
+    for backend in backends:
+        summaries = timer(f"write_reports_{backend}", write_projects, projects, backend)
+        timer(f"cross_project_{backend}", create_cross_project_overview,
+              summaries, backend=backend, output="memory", mapping=scenario.mapping)
+    return {product: len(data.df) for product, data in product_data.items()}
+
+
+def write_projects(projects: list, backend: str) -> list:
+    """
+    Write the reports of all projects with the backend into memory.
+    Returns the summaries of the projects with a report.
+    """
+    summaries = []
+    for project in projects:
+        if len(project.resources) == 0:
+            continue
+        save_report(partial(project.render_report, backend=backend), "", output="memory")
+        summaries.append(project.summary)
+    return summaries
+
+
+def git_commit() -> str:
+    """Commit of the benchmarked code, None outside of a git checkout"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(sizes: list, repeat: int = 3, seed: int = 0,
+                   backends: list = EXCEL_BACKENDS) -> dict:
+    """
+    Run the pipeline repeat times for every size.
+    Returns the results of all sizes with the environment they ran in.
+    """
+    results = []
+    for name, accounts, projects, records in sizes:
+        scenario = generate_scenario(accounts, projects, records, seed)
+        logging.info(f"Benchmarking {name}: {scenario}")
+        timer = StageTimer()
+        for _ in range(repeat):
+            rows = run_pipeline(scenario, timer, backends)
+        stages = timer.results()
+        for stage, result in stages.items():
+            logging.info(f"{name} {stage}: {result['best']:.3f}s")
+        results.append({
+            "size": name,
+            "accounts": accounts,
+            "projects": projects,
+            "records": records,
+            "rows": rows,
+            "stages": stages,
+        })
+    return {
+        "commit": git_commit(),
+        "created": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "openpyxl": openpyxl.__version__,
+        "seed": seed,
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the report pipeline on synthetic data.")
+    parser.add_argument(
+        "--sizes", default=DEFAULT_SIZES,
+        help=f"Comma separated sizes: {', '.join(SIZES)} or accounts:projects:records. "
+             f"Defaults to {DEFAULT_SIZES}.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per size, the fastest is reported.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the generated data.")
+    parser.add_argument(
+        "--backends", default=",".join(EXCEL_BACKENDS), help="Comma separated excel backends.")
+    parser.add_argument("--output", default=RESULTS_FILE, help=f"Results file. Defaults to {RESULTS_FILE}.")
+    args = parser.parse_args()
+
+    create_logger()
+    sizes = [parse_size(size) for size in args.sizes.split(",")]
+    results = run_benchmarks(sizes, args.repeat, args.seed, args.backends.split(","))
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+    logging.info(f"Wrote the results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
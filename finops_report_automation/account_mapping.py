@@ -0,0 +1,144 @@
+"""
+Module that loads the mapping between project names and AWS account ids.
+
+The mapping can be stored in an Excel file (the default accountMapping.xlsx),
+a CSV file or a SQLite database. Parsing Excel files is slow, so the parsed
+mapping is cached on disk and only read again if the file changes.
+
+Example usage:
+```
+mapping = load_account_mapping("./config/accountMapping.csv")
+account_ids = mapping.project_accounts["project1"]
+project_name = mapping.account_projects["123456789012"]
+```
+
+:license: AGPL v3, see LICENSE for more details
+:copyright: 2022 Liquid Reply GmbH
+"""
+import hashlib
+import logging
+import os
+import pickle
+import sqlite3
+import tempfile
+import pandas as pd
+
+CONFIG_PATH = os.environ.get("CONFIG_PATH") or "./config"
+ACCOUNT_MAPPING_PATH = os.environ.get("ACCOUNT_MAPPING_PATH") or f"{CONFIG_PATH}/accountMapping.xlsx"
+CACHE_PATH = os.environ.get("CACHE_PATH") or "./.cache"
+# Table queried when the mapping is stored in a SQLite database
+ACCOUNT_MAPPING_TABLE = "accountMapping"
+COLUMNS = ["projectName", "vendorAccountId"]
+
+# Mappings already loaded by this process, keyed like the disk cache
+_loaded_mappings = {}
+
+
+class AccountMapping:
+    def __init__(self, df: pd.DataFrame) -> None:
+        self.df = df
+        # project name -> list of account ids, in the order of the source
+        self.project_accounts = {
+            name: group["vendorAccountId"].to_list()
+            for name, group in df.groupby("projectName", sort=False)
+        }
+        # account id -> project name. The first project wins if an account
+        # is listed more than once.
+        self.account_projects = {}
+        for name, account_id in zip(df["projectName"], df["vendorAccountId"]):
+            self.account_projects.setdefault(account_id, name)
+
+    def __len__(self):
+        return len(self.df)
+
+
+def read_account_mapping(path: str) -> pd.DataFrame:
+    """
+    Read the raw mapping from an Excel, CSV or SQLite source.
+    Account ids are always read as strings, like the API returns them.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        df = pd.read_csv(
+            path,
+            names=COLUMNS,
+            header=0,
+            usecols=[0, 1],
+            dtype=str,
+        )
+    elif extension in [".db", ".sqlite", ".sqlite3"]:
+        with sqlite3.connect(path) as connection:
+            df = pd.read_sql_query(
+                f"SELECT projectName, vendorAccountId FROM {ACCOUNT_MAPPING_TABLE}",
+                connection,
+            )
+        df["vendorAccountId"] = df["vendorAccountId"].astype(str)
+    else:
+        df = pd.read_excel(
+            path,
+            names=COLUMNS,
+            skiprows=2,
+            usecols="A:B",
+            header=None,
+            dtype=str,
+        )
+    return df
+
+
+def mapping_cache_key(path: str) -> str:
+    """
+    Key of a mapping file based on its location, size and modification time.
+    Changing the file results in a new key.
+    """
+    stat = os.stat(path)
+    key = f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def write_mapping_cache(cache_file: str, df: pd.DataFrame):
+    """
+    Write the parsed mapping to a temporary file first, so concurrent runs
+    never read a partially written cache
+    """
+    tmp_path = None
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        descriptor, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_file), suffix=".tmp")
+        with os.fdopen(descriptor, "wb") as file:
+            pickle.dump(df, file)
+        os.replace(tmp_path, cache_file)
+    except OSError:
+        logging.warning(f"Could not write account mapping cache {cache_file}")
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def load_account_mapping(path: str = ACCOUNT_MAPPING_PATH) -> AccountMapping:
+    """
+    Load the account mapping. The file is parsed at most once per process
+    and the parsed form is reused between runs as long as the file is not
+    modified. SQLite sources are queried directly.
+    """
+    key = mapping_cache_key(path)
+    if key in _loaded_mappings:
+        return _loaded_mappings[key]
+
+    cache_file = f"{CACHE_PATH}/account_mapping/{key}.pickle"
+    use_disk_cache = not path.lower().endswith((".db", ".sqlite", ".sqlite3"))
+    df = None
+    if use_disk_cache and os.path.exists(cache_file):
+        try:
+            with open(cache_file, "rb") as file:
+                df = pickle.load(file)
+        except Exception:
+            # Corrupt files or pickles of other pandas versions are a cache miss
+            logging.warning(f"Ignoring unreadable account mapping cache {cache_file}")
+
+    if df is None:
+        df = read_account_mapping(path)
+        if use_disk_cache:
+            write_mapping_cache(cache_file, df)
+
+    mapping = AccountMapping(df)
+    _loaded_mappings[key] = mapping
+    return mapping
@@ -12,36 +12,167 @@ print(response)
 :copyright: 2022 Liquid Reply GmbH
 """
 
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import date, timedelta
+import logging
 import os
 import requests
-from json.decoder import JSONDecodeError
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 import yaml
 from .auth import get_api_key
+from .cache import ResponseCache
+from .errors import ApiError
 
 CONFIG_PATH = os.environ.get("CONFIG_PATH") or "./config"
+# Seconds to wait for the connection and for the response. Rightsizing
+# requests of large organizations take a while.
+API_CONNECT_TIMEOUT = float(os.environ.get("API_CONNECT_TIMEOUT") or 10)
+API_READ_TIMEOUT = float(os.environ.get("API_READ_TIMEOUT") or 300)
+# Failed requests are retried with an exponential backoff of
+# API_BACKOFF * 2^(retry - 1) seconds, or as long as the Retry-After
+# header of the response asks for
+API_RETRIES = int(os.environ.get("API_RETRIES") or 5)
+API_BACKOFF = float(os.environ.get("API_BACKOFF") or 1)
+API_POOL_SIZE = 10
+RETRY_STATUS_CODES = [429, 500, 502, 503, 504]
+# Number of recommendations requested per page
+RIGHTSIZING_PAGE_SIZE = int(os.environ.get("RIGHTSIZING_PAGE_SIZE") or 1000)
+# Maximum number of API requests running at the same time
+FETCH_WORKERS = int(os.environ.get("FETCH_WORKERS") or 4)
+
+
+def create_session(retries: int = API_RETRIES, backoff_factor: float = API_BACKOFF) -> requests.Session:
+    """
+    Create a session that keeps connections open between requests and
+    retries failed requests.
+    """
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=["GET"],
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=API_POOL_SIZE,
+        pool_maxsize=API_POOL_SIZE,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def fetch_all(calls: dict, workers: int = FETCH_WORKERS):
+    """
+    Run the independent calls of the dictionary in a thread pool with at
+    most workers calls at the same time.
+    Yields (key, result) tuples in the order the calls complete. If a call
+    fails, the calls that did not start yet are cancelled and the error is
+    raised.
+    """
+    executor = ThreadPoolExecutor(max_workers=max(workers, 1))
+    futures = {}
+    try:
+        for key, call in calls.items():
+            futures[executor.submit(call)] = key
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+    finally:
+        # shutdown(cancel_futures=True) needs Python 3.9
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=True)
+
 
 class Api:
-    def __init__(self, base_url, params={}) -> None:
+    def __init__(
+        self,
+        base_url,
+        params={},
+        timeout=(API_CONNECT_TIMEOUT, API_READ_TIMEOUT),
+        retries=API_RETRIES,
+        backoff_factor=API_BACKOFF,
+        cache: ResponseCache = None,
+    ) -> None:
         self.base_url = base_url
         self.params = params
+        self.timeout = timeout
+        # Responses are only cached on disk if a cache is given
+        self.cache = cache
+        self.session = create_session(retries, backoff_factor)
+        self._api_key = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
 
     @property
     def api_key(self):
-        return get_api_key()
+        # The key does not change while the job runs
+        if self._api_key is None:
+            self._api_key = get_api_key()
+        return self._api_key
+
+    def close(self):
+        self.session.close()
 
     def request(self, path, params=None):
-        """Use the requests module to send the request"""
-        response = requests.get(
-          f"{self.base_url}{path}",
-          params=params,
-          auth=(self.api_key, "")
-        )
+        """
+        Send a GET request with the pooled session. Fresh responses of the
+        cache are returned without a request, stale ones are revalidated.
+        Raises an ApiError if the request fails after all retries or the
+        response is not valid JSON.
+        """
+        url = f"{self.base_url}{path}"
+        entry = None
+        headers = {}
+        if self.cache is not None:
+            key = self.cache.key(url, params, self.api_key)
+            entry = self.cache.load(key)
+            if entry is not None:
+                if self.cache.is_fresh(entry, path):
+                    logging.debug(f"Using cached response of {url}")
+                    return entry["body"]
+                headers = self.cache.validators(entry)
+        try:
+            response = self.session.get(
+              url,
+              params=params,
+              auth=(self.api_key, ""),
+              headers=headers,
+              timeout=self.timeout
+            )
+        except requests.RequestException as error:
+            raise ApiError(f"Request to {url} failed: {error}") from error
+
+        if response.status_code == 304 and entry is not None:
+            logging.debug(f"Cached response of {url} is still valid")
+            self.cache.refresh(key, entry)
+            return entry["body"]
+
+        if not response.ok:
+            raise ApiError(
+                f"Request to {url} failed with status {response.status_code}",
+                response.status_code)
         try:
-            return response.json()
-        except JSONDecodeError:
-            return {}
+            data = response.json()
+        except ValueError as error:
+            raise ApiError(
+                f"Response of {url} is not valid JSON", response.status_code) from error
+        if self.cache is not None:
+            self.cache.store(
+                key, data, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+        return data
 
 
     def get_accounts(self):
@@ -62,9 +193,44 @@ class Api:
         file this will either return ec2, ebs, s3 or rds results.
         """
 
-        resp = self.request(
-            f'/v3/rightsizing/aws/recommendations/{config["product"]}', config)
-        return resp
+        return {"result": [
+            record for batch in self.iter_rightsizing(config) for record in batch
+        ]}
+
+
+    def iter_rightsizing(self, config, page_size=None):
+        """
+        Same as get_rightsizing, but pages through the recommendations with
+        limit and offset. Yields the records of every page as a list, so only
+        one page has to be held in memory.
+        The limit of the config is used as page size, RIGHTSIZING_PAGE_SIZE
+        if it has none, and paging starts at the offset of the config.
+        Paging stops at an empty page or at the total count of the response.
+        Pages may be shorter than requested if the API caps the limit.
+        """
+        if page_size is None:
+            page_size = int(config.get("limit") or RIGHTSIZING_PAGE_SIZE)
+        offset = int(config.get("offset") or 0)
+        previous = None
+        while True:
+            params = {**config, "limit": page_size, "offset": offset}
+            resp = self.request(
+                f'/v3/rightsizing/aws/recommendations/{config["product"]}', params)
+            records = resp["result"]
+            if len(records) == 0:
+                break
+            # An API that ignores the offset returns the same page again
+            if records == previous:
+                logging.warning(
+                    f"Offset {offset} of {config['product']} returned the previous page again, "
+                    "stopping the pagination")
+                break
+            yield records
+            offset += len(records)
+            total = (resp.get("meta") or {}).get("totalCount")
+            if total is not None and offset >= int(total):
+                break
+            previous = records
 
 
     def get_amortized_cost(self):
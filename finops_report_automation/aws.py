@@ -2,27 +2,225 @@
 :license: AGPL v3, see LICENSE for more details
 :copyright: 2022 Liquid Reply GmbH
 """
+from concurrent.futures import ThreadPoolExecutor
+import json
 import os
 import logging
 
+from boto3.exceptions import S3UploadFailedError
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import BotoCoreError, ClientError
 
-BUCKET_NAME = os.environ.get("BUCKET_NAME") or False
+from .errors import UploadError
+
+# Number of files uploaded at the same time
+UPLOAD_WORKERS = int(os.environ.get("UPLOAD_WORKERS") or 8)
+# Files larger than the threshold are uploaded in parts of the chunk size
+MB = 1024 * 1024
+MULTIPART_THRESHOLD = int(os.environ.get("MULTIPART_THRESHOLD_MB") or 8) * MB
+MULTIPART_CHUNKSIZE = int(os.environ.get("MULTIPART_CHUNKSIZE_MB") or 8) * MB
+# Parts of a single file uploaded at the same time
+MULTIPART_CONCURRENCY = int(os.environ.get("MULTIPART_CONCURRENCY") or 4)
+# Prefix of the content addressed objects, see UploadManager.upload_content
+CONTENT_PREFIX = "content"
+# Error codes of a head request for an object that does not exist
+MISSING_OBJECT_CODES = ["404", "NoSuchKey", "NotFound"]
 
 logging.getLogger()
 
-def upload_to_s3(s3_client, local_file, file_with_path): 
+
+def content_key(digest: str, extension: str) -> str:
+    """Key of the content object of a file, e.g. content/<sha256>.xlsx"""
+    return f"{CONTENT_PREFIX}/{digest}{extension}"
+
+
+class UploadResult:
+    """Outcome of the upload of a single file"""
+    def __init__(self, local_file, key, error=None, skipped=False) -> None:
+        self.local_file = local_file
+        self.key = key
+        self.error = error
+        # The object already existed and was not uploaded again
+        self.skipped = skipped
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def __repr__(self):
+        status = "ok" if self.ok else f"failed: {self.error}"
+        if self.skipped:
+            status = "skipped"
+        return f"UploadResult({self.local_file} -> {self.key}, {status})"
+
+
+class UploadManager:
     """
-    Upload files to S3. file_with_path should include the full path to where the file should be stored.
-    E.g. 2022/05/12/cross_project_overview.xlsx
+    Queues files and uploads them to the bucket in a thread pool, so
+    uploads run while the next reports are written.
+
+    Example usage:
+    ```
+    with UploadManager(boto3.client("s3"), "my-bucket") as uploads:
+        uploads.upload("./reports/project.xlsx", "2022/05/12/project.xlsx")
+    print(uploads.results)
+    ```
+
+    Files uploaded with upload_content are stored under the hash of their
+    content, so a file that did not change since the last run is not
+    uploaded again. The index of a run maps the names of its files to
+    these content objects and is written with write_index.
     """
-    try:
-        s3_client.upload_file(local_file, f"{BUCKET_NAME}", file_with_path )
-    except FileNotFoundError:
-        logging.info("The file was not found")
-        return ""    
-    except KeyError:
-        return ""
+    def __init__(
+        self,
+        s3_client,
+        bucket: str,
+        workers: int = UPLOAD_WORKERS,
+        transfer_config: TransferConfig = None,
+    ) -> None:
+        self.s3_client = s3_client
+        self.bucket = bucket
+        if transfer_config is None:
+            transfer_config = TransferConfig(
+                multipart_threshold=MULTIPART_THRESHOLD,
+                multipart_chunksize=MULTIPART_CHUNKSIZE,
+                max_concurrency=MULTIPART_CONCURRENCY,
+            )
+        self.transfer_config = transfer_config
+        self.workers = max(workers, 1)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        self.futures = []
+        self.results = []
+        self.index = {}
+
+    def __enter__(self):
+        return self
 
+    def __exit__(self, *args):
+        self.wait()
+
+    def upload(self, local_file, key: str, skip_existing: bool = False):
+        """
+        Queue the upload of a file. local_file is a file path or a binary
+        file object, e.g. a BytesIO buffer, that is read from its current
+        position. With skip_existing the file is not uploaded if the key
+        already exists in the bucket.
+        Returns a future of the UploadResult.
+        """
+        future = self.executor.submit(self.upload_file, local_file, key, skip_existing)
+        self.futures.append(future)
+        return future
+
+    def upload_content(self, local_file, name: str, digest: str, extension: str):
+        """
+        Queue the upload of a file to the content object of its hash and
+        add it to the index under name, e.g. "Project reports/project.xlsx".
+        Returns a future of the UploadResult.
+        """
+        key = content_key(digest, extension)
+        self.index[name] = key
+        return self.upload(local_file, key, skip_existing=True)
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.s3_client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as error:
+            if error.response.get("Error", {}).get("Code") not in MISSING_OBJECT_CODES:
+                logging.warning(f"Could not check if {key} exists, uploading it: {error}")
+            return False
+        except BotoCoreError as error:
+            logging.warning(f"Could not check if {key} exists, uploading it: {error}")
+            return False
+        return True
+
+    def upload_file(self, local_file, key: str, skip_existing: bool = False) -> UploadResult:
+        # Buffers have no file name and are not kept in the results
+        if not isinstance(local_file, str):
+            local_file, fileobj = "<memory>", local_file
+        else:
+            fileobj = None
+        if skip_existing and self.exists(key):
+            logging.debug(f"Skipping {local_file}, {key} is already uploaded")
+            return UploadResult(local_file, key, skipped=True)
+        try:
+            if fileobj is not None:
+                self.s3_client.upload_fileobj(
+                    Fileobj=fileobj,
+                    Bucket=self.bucket,
+                    Key=key,
+                    Config=self.transfer_config,
+                )
+            else:
+                self.s3_client.upload_file(
+                    Filename=local_file,
+                    Bucket=self.bucket,
+                    Key=key,
+                    Config=self.transfer_config,
+                )
+        except (OSError, BotoCoreError, ClientError, S3UploadFailedError) as error:
+            logging.error(f"Upload of {local_file} to {key} failed: {error}")
+            return UploadResult(local_file, key, error)
+        logging.debug(f"Uploaded {local_file} to {key}")
+        return UploadResult(local_file, key)
+
+    def wait(self) -> list:
+        """
+        Wait for all queued uploads. Returns the results of all uploads in
+        the order they were queued.
+        """
+        self.results.extend(future.result() for future in self.futures)
+        self.futures = []
+        self.executor.shutdown(wait=True)
+        return self.results
+
+    def write_index(self, key: str, **metadata) -> UploadResult:
+        """
+        Write the index of the content objects after all uploads finished.
+        Files whose upload failed are left out. Additional metadata, e.g.
+        the date of the run, is stored next to the files.
+        """
+        uploaded = {result.key for result in self.results if result.ok}
+        files = {name: content for name, content in self.index.items() if content in uploaded}
+        body = json.dumps({**metadata, "files": files}, indent=2, sort_keys=True)
+        try:
+            self.s3_client.put_object(
+                Bucket=self.bucket,
+                Key=key,
+                Body=body.encode(),
+                ContentType="application/json",
+            )
+            result = UploadResult(None, key)
+        except (BotoCoreError, ClientError) as error:
+            logging.error(f"Writing the index {key} failed: {error}")
+            result = UploadResult(None, key, error)
+        self.results.append(result)
+        return result
+
+    def raise_for_failures(self):
+        """Raise an UploadError if any of the finished uploads failed"""
+        failed = [result for result in self.results if not result.ok]
+        if len(failed) > 0:
+            raise UploadError(
+                f"{len(failed)} of {len(self.results)} uploads failed: "
+                f"{[result.key for result in failed]}")
+
+
+def download_raw_archive(s3_client, bucket: str, prefix: str, dst_folder: str) -> str:
+    """
+    Rebuild the raw API archive of a day from its index, e.g. for prefix
+    2022/05/12, by downloading the content objects of its raw_api files.
+    Returns the folder of the archive, which can be replayed.
+    """
+    response = s3_client.get_object(Bucket=bucket, Key=f"{prefix}/index.json")
+    files = json.loads(response["Body"].read())["files"]
+    os.makedirs(dst_folder, exist_ok=True)
+    for name, key in files.items():
+        if not name.startswith("raw_api/"):
+            continue
+        filepath = f"{dst_folder}/{os.path.basename(name)}"
+        logging.info(f"Downloading {key} to {filepath}")
+        s3_client.download_file(Bucket=bucket, Key=key, Filename=filepath)
+    return dst_folder
 
 
 # Placeholder for a SQS integration
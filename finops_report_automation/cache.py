@@ -0,0 +1,137 @@
+"""
+Module that caches responses of the Cloudability API on disk, so reruns
+on the same day do not download everything again.
+
+Responses are stored gzip compressed and keyed by url, parameters and a
+hash of the API key, so runs for different API keys never share entries.
+A response younger than the time to live of its endpoint is used without
+asking the API. Older responses are revalidated with the ETag and
+Last-Modified headers the API sent, if any. Entries that were not stored
+or revalidated for longer than the largest time to live plus a grace
+period are removed when the cache is opened.
+
+Example usage:
+```
+cache = ResponseCache()
+api = Api("https://api.cloudability.com", cache=cache)
+```
+
+:license: AGPL v3, see LICENSE for more details
+:copyright: 2022 Liquid Reply GmbH
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+
+CACHE_PATH = os.environ.get("CACHE_PATH") or "./.cache"
+# Seconds a response is used without revalidation, by path prefix.
+# The first matching prefix wins.
+CACHE_TTLS = {
+    "/v3/vendors/": 24 * 60 * 60,
+    "/v3/rightsizing/": 4 * 60 * 60,
+    "/v3/internal/reporting/": 4 * 60 * 60,
+}
+DEFAULT_TTL = 0
+# Hours an expired entry is kept for revalidation before it is removed
+CACHE_GRACE = int(os.environ.get("API_CACHE_GRACE_HOURS") or 24) * 60 * 60
+
+
+class ResponseCache:
+    def __init__(self, path: str = f"{CACHE_PATH}/api", ttls: dict = CACHE_TTLS,
+                 default_ttl: int = DEFAULT_TTL, grace: int = CACHE_GRACE) -> None:
+        self.path = path
+        self.ttls = ttls
+        self.default_ttl = default_ttl
+        self.grace = grace
+        os.makedirs(path, exist_ok=True)
+        self.evict()
+
+    def key(self, url: str, params=None, credential: str = None) -> str:
+        """
+        Key of a request, independent of the order of the parameters.
+        Only the hash of the credential is part of the key.
+        """
+        credential_hash = hashlib.sha256((credential or "").encode()).hexdigest()
+        request = json.dumps([url, params or {}, credential_hash], sort_keys=True, default=str)
+        return hashlib.sha256(request.encode()).hexdigest()
+
+    def ttl(self, path: str) -> int:
+        for prefix, ttl in self.ttls.items():
+            if path.startswith(prefix):
+                return ttl
+        return self.default_ttl
+
+    def evict(self):
+        """
+        Remove the entries and left over temporary files that were not
+        written for longer than the largest time to live plus the grace
+        period. Entries are rewritten when they are revalidated.
+        """
+        max_age = max([self.default_ttl, *self.ttls.values()]) + self.grace
+        now = time.time()
+        removed = 0
+        for entry in os.scandir(self.path):
+            try:
+                if entry.is_file() and now - entry.stat().st_mtime > max_age:
+                    os.remove(entry.path)
+                    removed += 1
+            except OSError:
+                logging.warning(f"Could not remove expired cache entry {entry.path}")
+        if removed > 0:
+            logging.debug(f"Removed {removed} expired cache entries from {self.path}")
+
+    def filepath(self, key: str) -> str:
+        return f"{self.path}/{key}.json.gz"
+
+    def load(self, key: str):
+        """
+        Return the cached entry with the response body, the time it was
+        stored and the validators, or None.
+        """
+        try:
+            with gzip.open(self.filepath(key), "rt") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, EOFError):
+            logging.warning(f"Ignoring unreadable cache entry {self.filepath(key)}")
+            return None
+
+    def is_fresh(self, entry: dict, path: str) -> bool:
+        return time.time() - entry["stored"] < self.ttl(path)
+
+    def validators(self, entry: dict) -> dict:
+        """Headers of a conditional request revalidating the entry"""
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def store(self, key: str, body, etag: str = None, last_modified: str = None):
+        entry = {
+            "stored": time.time(),
+            "etag": etag,
+            "last_modified": last_modified,
+            "body": body,
+        }
+        # Write to a temporary file first, so concurrent requests never
+        # read a partially written entry
+        descriptor, tmp_path = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        try:
+            with gzip.open(os.fdopen(descriptor, "wb"), "wt") as file:
+                json.dump(entry, file)
+            os.replace(tmp_path, self.filepath(key))
+        except OSError:
+            logging.warning(f"Could not write cache entry {self.filepath(key)}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def refresh(self, key: str, entry: dict):
+        """The API confirmed the entry is still valid, keep it for another TTL"""
+        self.store(key, entry["body"], entry.get("etag"), entry.get("last_modified"))
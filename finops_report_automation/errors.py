@@ -12,3 +12,13 @@ class ApiTokenError(Exception):
 
 class ColorError(Exception):
     pass
+
+
+class ApiError(Exception):
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class UploadError(Exception):
+    pass
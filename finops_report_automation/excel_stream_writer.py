@@ -0,0 +1,297 @@
+"""
+Module that writes the excel reports in openpyxl write-only mode.
+
+The rows of every sheet are streamed to the file in order instead of
+building the whole workbook in memory, so all styles are created up front
+and column widths and row heights are set before the rows are written.
+The sheets have the same layout as the ones created by excel_writer.
+
+For more information:
+https://openpyxl.readthedocs.io/en/stable/optimized.html#write-only-mode
+
+:license: AGPL v3, see LICENSE for more details
+:copyright: 2022 Liquid Reply GmbH
+"""
+from datetime import date
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+
+from .resource import Resource
+from .messages_helper import label
+from .formatting import (
+    SUM_CURRENCY_COLUMNS,
+    SUM_PERCENTAGE_COLUMNS,
+    SUMMARY_CURRENCY_COLUMNS,
+    SUMMARY_PERCENTAGE_COLUMNS,
+    DATA_FONT,
+    HEADER_ALIGNMENT,
+    HEADER_FILL,
+    HEADER_HEIGHT,
+    ROW_FILLS,
+    TERMINATE_FONT,
+    apply_column_widths,
+    column_number_formats,
+    column_widths,
+    get_font,
+    humanize_summary_headers,
+    medium_border,
+    row_style_codes,
+    terminate_cells,
+)
+
+
+class SheetStream:
+    """
+    Appends rows to a write-only worksheet by their row number.
+    Skipped rows are written as empty rows.
+    """
+    def __init__(self, worksheet):
+        self.worksheet = worksheet
+        self.next_row = 1
+
+    def write(self, row: int, cells: list, height: float = None):
+        while self.next_row < row:
+            self.worksheet.append([])
+            self.next_row += 1
+        if height is not None:
+            self.worksheet.row_dimensions[row].height = height
+        self.worksheet.append(cells)
+        self.next_row += 1
+
+
+def cell_value(value):
+    """
+    Convert a dataframe value to a value openpyxl can write.
+    Missing values are written as empty cells.
+    """
+    if pd.api.types.is_scalar(value) and pd.isna(value):
+        return None
+    if hasattr(value, "item"):
+        return value.item()
+    return value
+
+
+def styled_cell(worksheet, value, font=None, fill=None, border=None, alignment=None,
+                number_format=None):
+    cell = WriteOnlyCell(worksheet, value=value)
+    if number_format is not None:
+        cell.number_format = number_format
+    if font is not None:
+        cell.font = font
+    if fill is not None:
+        cell.fill = fill
+    if border is not None:
+        cell.border = border
+    if alignment is not None:
+        cell.alignment = alignment
+    return cell
+
+
+def header_cells(worksheet, columns) -> list:
+    return [
+        styled_cell(worksheet, column, fill=HEADER_FILL,
+                    border=medium_border, alignment=HEADER_ALIGNMENT)
+        for column in columns
+    ]
+
+
+def number_cells(worksheet, values, number_formats) -> list:
+    """
+    Cells of a single row without background, formatted with the number
+    format of their column.
+    """
+    return [
+        styled_cell(worksheet, cell_value(value), number_format=number_format)
+        for value, number_format in zip(values, number_formats)
+    ]
+
+
+def data_rows(worksheet, df: pd.DataFrame, codes, number_formats=None):
+    """
+    Yield the styled cells of every dataframe row, using the row style
+    codes for the background. Cells with the value "Terminate" are
+    written in red.
+    """
+    terminate_mask = terminate_cells(df)
+    if number_formats is None:
+        number_formats = [None] * df.shape[1]
+    for values, code, row_mask in zip(df.itertuples(index=False, name=None), codes, terminate_mask):
+        fill = ROW_FILLS[code]
+        yield [
+            styled_cell(
+                worksheet,
+                cell_value(value),
+                font=TERMINATE_FONT if is_terminate else DATA_FONT,
+                fill=fill,
+                number_format=number_format,
+            )
+            for value, is_terminate, number_format in zip(values, row_mask, number_formats)
+        ]
+
+
+def write_summary_sheet(
+    workbook: Workbook,
+    sheet_name: str,
+    project_name: str,
+    summary: pd.DataFrame,
+    sum: pd.DataFrame
+):
+    """ Creates the general sheet for the project"""
+    worksheet = workbook.create_sheet(sheet_name)
+    stream = SheetStream(worksheet)
+
+    number_formats = column_number_formats(
+        summary.columns, SUMMARY_CURRENCY_COLUMNS, SUMMARY_PERCENTAGE_COLUMNS)
+    headers = humanize_summary_headers(summary.columns)
+    # We write the summary to column 'B'
+    apply_column_widths(worksheet, 2, column_widths(summary, headers, number_formats))
+
+    # Writes information about the report.
+    stream.write(1, [styled_cell(
+        worksheet, f'Account overview for {project_name}',
+        font=get_font(size=16, color="black", bold=True))])
+    stream.write(2, [styled_cell(
+        worksheet, f'State of analysis: {str(date.today())}',
+        font=get_font(size=9, color="black"))])
+    stream.write(3, [styled_cell(
+        worksheet, 'Review period: 10 days',
+        font=get_font(size=9, color="black"))])
+    current_row = 5
+
+    stream.write(current_row, [None] + header_cells(worksheet, headers),
+                 height=HEADER_HEIGHT)
+    codes = row_style_codes(summary, "name", highlight_terminate=True)
+    for cells in data_rows(worksheet, summary, codes, number_formats):
+        current_row += 1
+        stream.write(current_row, [None] + cells)
+    current_row += 1
+
+    number_formats = column_number_formats(
+        sum.columns, SUM_CURRENCY_COLUMNS, SUM_PERCENTAGE_COLUMNS)
+    for values in sum.itertuples(index=False, name=None):
+        current_row += 1
+        sum_cell = styled_cell(worksheet, 'SUM all accounts',
+                               font=get_font(size=12, color="black", bold=True))
+        # The sum values start at column 'G'
+        stream.write(current_row, [None, sum_cell, None, None, None, None] + number_cells(
+            worksheet, values, number_formats))
+
+
+def write_cross_project_sheet(
+    workbook: Workbook,
+    sheet_name: str,
+    summary: pd.DataFrame,
+):
+    """ Creates the cross-project overview excel file."""
+    worksheet = workbook.create_sheet(sheet_name)
+    stream = SheetStream(worksheet)
+
+    number_formats = column_number_formats(
+        summary.columns, SUMMARY_CURRENCY_COLUMNS, SUMMARY_PERCENTAGE_COLUMNS)
+    headers = humanize_summary_headers(summary.columns)
+    headers = ["Parent IT System" if column == "projectName" else header
+               for column, header in zip(summary.columns, headers)]
+    apply_column_widths(worksheet, 1, column_widths(summary, headers, number_formats))
+
+    stream.write(1, [styled_cell(
+        worksheet, "OVERVIEW: RECOMMENDATIONS ALL ACCOUNTS",
+        font=get_font(size=16, color="black", bold=True))])
+    current_row = 3
+    stream.write(current_row, header_cells(worksheet, headers),
+                 height=HEADER_HEIGHT)
+    for values in summary.itertuples(index=False, name=None):
+        current_row += 1
+        stream.write(current_row, number_cells(worksheet, values, number_formats))
+
+
+def write_resource_sheet(
+    workbook: Workbook,
+    sheet_name: str,
+    resource: Resource
+):
+    """Creates the excel report for the specified resource"""
+    worksheet = workbook.create_sheet(sheet_name)
+    stream = SheetStream(worksheet)
+
+    accounts = resource.affected_accounts()
+    rightsize = resource.recommendation_summary(action="rightsize")
+    terminate = resource.recommendation_summary(action="terminate")
+    headers = resource.humanized_headers()
+    apply_column_widths(worksheet, 1, column_widths(resource.df, headers))
+
+    current_row = 1
+    stream.write(current_row, [styled_cell(
+        worksheet, "Accounts Affected", font=get_font(size=14, color="blue", bold=True))])
+    for values in accounts.itertuples(index=False, name=None):
+        current_row += 1
+        stream.write(current_row, [
+            styled_cell(worksheet, cell_value(value), border=medium_border)
+            for value in values
+        ])
+    current_row = 1 + 3 + len(accounts)
+
+    stream.write(current_row, [styled_cell(
+        worksheet, "Recommendations", font=get_font(size=14, color="blue", bold=True))])
+    current_row += 1
+
+    # Write the termination section of the recommendations
+    stream.write(current_row, [styled_cell(
+        worksheet, "Termination", font=get_font(size=11, color="red", bold=True))])
+    message_terminate = label(resource, terminate, "terminate")
+    for row, message in enumerate(message_terminate["message"], start=current_row + 1):
+        stream.write(row, [message])
+    current_row += 2 + len(terminate)
+
+    # Write the rightsizing section of the recommendations
+    stream.write(current_row, [styled_cell(
+        worksheet, "Rightsizing", font=get_font(size=11, color="black", bold=True))])
+    message_rightsize = label(resource, rightsize, "rightsize")
+    for row, message in enumerate(message_rightsize["message"], start=current_row + 1):
+        stream.write(row, [message])
+    current_row += 4 + len(rightsize)
+
+    # Write the based reporting section
+    stream.write(current_row, [styled_cell(
+        worksheet, "Based Reporting", font=get_font(size=14, color="blue", bold=True))])
+    current_row += 1
+
+    info_message = "Please find all utilization analysis per resource in Cloudability -> Rightsizing -> EC2."
+    stream.write(current_row, [styled_cell(
+        worksheet, info_message, font=get_font(size=10, color="light_purple"))])
+    current_row += 1
+
+    info_message = "! Considered basis: Effective Costs. Recommendations take into account historical reservation coverage for the current instance."
+    stream.write(current_row, [styled_cell(
+        worksheet, info_message, font=get_font(size=10, color="pink"))])
+    current_row += 1
+
+    # Write the consolidate report
+    stream.write(current_row, header_cells(worksheet, headers),
+                 height=HEADER_HEIGHT)
+    codes = row_style_codes(resource.df, "vendorAccountId")
+    for cells in data_rows(worksheet, resource.df, codes):
+        current_row += 1
+        stream.write(current_row, cells)
+
+
+def write_project_workbook(
+    filename: str,
+    project_name: str,
+    summary: pd.DataFrame,
+    sum: pd.DataFrame,
+    resources: list
+):
+    """Writes the general sheet and one sheet per resource to the file"""
+    workbook = Workbook(write_only=True)
+    write_summary_sheet(workbook, "General", project_name, summary, sum)
+    for resource in resources:
+        write_resource_sheet(workbook, resource.name.upper(), resource)
+    workbook.save(filename)
+
+
+def write_cross_project_workbook(filename: str, summary: pd.DataFrame):
+    """Writes the cross-project overview to the file"""
+    workbook = Workbook(write_only=True)
+    write_cross_project_sheet(workbook, "General", summary)
+    workbook.save(filename)
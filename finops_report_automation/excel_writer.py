@@ -17,11 +17,21 @@ import pandas as pd
 from .resource import Resource
 from .messages_helper import label
 from .formatting import (
-  format_color_groups,
+  SUM_CURRENCY_COLUMNS,
+  SUM_PERCENTAGE_COLUMNS,
+  SUMMARY_CURRENCY_COLUMNS,
+  SUMMARY_PERCENTAGE_COLUMNS,
+  apply_column_widths,
+  apply_number_formats,
+  apply_row_styles,
+  column_number_formats,
+  column_widths,
   get_font,
-  humanize_summary_columns,
+  humanize_summary_headers,
   medium_border,
-  color_terminate,
+  row_style_codes,
+  terminate_cells,
+  write_table_header,
 )
 
 
@@ -56,51 +66,30 @@ def write_summary_sheet(
 
     # Styling the report data.
     summary_len = len(summary)
+    number_formats = column_number_formats(
+        summary.columns, SUMMARY_CURRENCY_COLUMNS, SUMMARY_PERCENTAGE_COLUMNS)
 
-    for col in ["highestOptimization", "monthlySavings", "annualSavings", "amortizedCost"]:
-        summary[col] = summary[col].apply(lambda x: f"${x:.2f}")
-    summary["relationPotentialSavings"] = summary["relationPotentialSavings"].apply(
-        lambda x: f"{x:.2%}")
-
-    summary_style = summary.style.applymap(
-        lambda x: 'color:red;' if x == "Terminate" else 'color:black').apply(
-            format_color_groups, group="name", axis=None).apply(
-            color_terminate, axis=None)
-
-    summary_style.to_excel(writer, sheet_name, startrow=current_row+1,
-                           startcol=1, index=False, header=False)
+    summary.to_excel(writer, sheet_name, startrow=current_row+1,
+                     startcol=1, index=False, header=False)
     worksheet = writer.sheets[sheet_name]
-
-    summary = humanize_summary_columns(summary)
+    apply_row_styles(
+        worksheet, current_row+2, 2,
+        row_style_codes(summary, "name", highlight_terminate=True),
+        terminate_cells(summary))
+    apply_number_formats(worksheet, current_row+2, 2, summary_len, number_formats)
 
     # We write the summary to column 'B'
-    indentation = 2
-    cells = worksheet[f'B{current_row+1}':f'K{current_row+1}']
-    for cell in cells[0]:
-        cell.alignment = cell.alignment.copy(wrap_text=True, vertical='top')
-        cell.border = medium_border
-        width_recommendation = len(
-            str(summary.iloc[0, (cell.column - indentation)]))
-        width_header = len(
-            str(summary.columns[(cell.column - indentation)]))
-        worksheet.column_dimensions[cell.column_letter].width = width_recommendation + 5 if width_recommendation > (
-            width_header / 3) else (width_header / 3) + 5
-
-    worksheet.row_dimensions[current_row+1].height = 55
-    table_header = pd.DataFrame(list(summary.columns.values)).transpose()
-    table_header = table_header.style.set_properties(
-        **{'background-color': 'lightblue'})
-    table_header.to_excel(writer, sheet_name, startrow=current_row,
-                          startcol=1, index=False, header=False)
+    headers = humanize_summary_headers(summary.columns)
+    write_table_header(worksheet, current_row+1, 2, headers)
+    apply_column_widths(worksheet, 2, column_widths(summary, headers, number_formats))
 
     current_row += summary_len + 2
 
-    for col in ["monthly_saving_potential", "annual_savings_potential", "cost"]:
-        sum[col] = sum[col].apply(lambda x: f"${x:.2f}")
-    sum["relation"] = sum["relation"].apply(lambda x: f"{x:.2%}")
-
     sum.to_excel(writer, sheet_name, index=False, header=False,
                  startrow=current_row, startcol=6)
+    apply_number_formats(
+        worksheet, current_row+1, 7, len(sum),
+        column_number_formats(sum.columns, SUM_CURRENCY_COLUMNS, SUM_PERCENTAGE_COLUMNS))
     sum_cell = worksheet.cell(
         row=current_row+1, column=2, value=f'SUM all accounts')
     sum_cell.font = get_font(size=12, color="black", bold=True)
@@ -124,30 +113,16 @@ def write_cross_project_sheet(
     summary.to_excel(writer, sheet_name, startrow=current_row+1,
                            startcol=0, index=False, header=False)
     worksheet = writer.sheets[sheet_name]
+    number_formats = column_number_formats(
+        summary.columns, SUMMARY_CURRENCY_COLUMNS, SUMMARY_PERCENTAGE_COLUMNS)
+    apply_number_formats(worksheet, current_row+2, 1, len(summary), number_formats)
+
+    headers = humanize_summary_headers(summary.columns)
+    headers = ["Parent IT System" if column == "projectName" else header
+               for column, header in zip(summary.columns, headers)]
+    write_table_header(worksheet, current_row+1, 1, headers)
+    apply_column_widths(worksheet, 1, column_widths(summary, headers, number_formats))
 
-    summary = humanize_summary_columns(summary)
-    summary = summary.rename(columns={"projectName": "Parent IT System"})
-
-
-    indentation = 1
-    cells = worksheet[f'A{current_row+1}':f'K{current_row+1}']
-    for cell in cells[0]:
-        cell.alignment = cell.alignment.copy(wrap_text=True, vertical='top')
-        cell.border = medium_border
-        # Format cell width based on the length of either the first value in the table or the header, depending of which is longer.
-        width_recommendation = len(
-            str(summary.iloc[0, (cell.column - indentation)]))
-        width_header = len(
-            str(summary.columns[(cell.column - indentation)]))
-        worksheet.column_dimensions[cell.column_letter].width = width_recommendation + 5 if width_recommendation > (
-            width_header / 3) else (width_header / 3) + 5
-
-    worksheet.row_dimensions[current_row+1].height = 55
-    table_header = pd.DataFrame(list(summary.columns.values)).transpose()
-    table_header = table_header.style.set_properties(
-        **{'background-color': 'lightblue'})
-    table_header.to_excel(writer, sheet_name, startrow=current_row,
-                          startcol=0, index=False, header=False)
 
 def write_resource_sheet(
     writer: pd.ExcelWriter,
@@ -228,24 +203,13 @@ def write_resource_sheet(
     current_row += 1
 
     # Write the consolidate report to the excel
-    resource_df = resource.df.style.apply(format_color_groups, group="vendorAccountId", axis=None).applymap(
-        lambda x: 'color:red;' if x == "Terminate" else 'color:black')
-    resource_df.to_excel(writer, sheet_name,
+    resource.df.to_excel(writer, sheet_name,
                          startrow=current_row, index=False, header=False)
-
-    resource.df = resource.humanize_columns()
-    worksheet.row_dimensions[current_row].height = 55
-    table_header = pd.DataFrame(list(resource.df.columns.values)).transpose()
-    table_header = table_header.style.set_properties(
-        **{'background-color': 'lightblue'})
-    table_header.to_excel(writer, sheet_name, startrow=current_row - 1,
-                          index=False, header=False)
-
-    cells = worksheet[current_row]
-    for cell in cells[0:len(cells)]:
-        cell.alignment = cell.alignment.copy(wrap_text=True, vertical='top')
-        cell.border = medium_border
-        width_recommendation = len(str(resource.df.iloc[0, (cell.column - 1)]))
-        width_header = len(str(resource.df.columns[(cell.column - 1)]))
-        worksheet.column_dimensions[cell.column_letter].width = width_recommendation + 5 if width_recommendation > (
-            width_header / 3) else (width_header / 3) + 5
+    apply_row_styles(
+        worksheet, current_row+1, 1,
+        row_style_codes(resource.df, "vendorAccountId"),
+        terminate_cells(resource.df))
+
+    headers = resource.humanized_headers()
+    write_table_header(worksheet, current_row, 1, headers)
+    apply_column_widths(worksheet, 1, column_widths(resource.df, headers))
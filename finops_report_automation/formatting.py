@@ -6,8 +6,10 @@ or using the Dataframes.io.style properties
 :license: AGPL v3, see LICENSE for more details
 :copyright: 2022 Liquid Reply GmbH
 """
+import numpy as np
 import pandas as pd
-from openpyxl.styles import Font
+from openpyxl.styles import Alignment, Font, PatternFill
+from openpyxl.utils import get_column_letter
 from .errors import ColorError
 from .constants import GENERAL_SHEET_CONFIGURATION
 from openpyxl.styles.borders import Border, Side
@@ -21,52 +23,187 @@ COLORS = {
     "light_purple": "8c5371"
 }
 
+# Columns of the summary and sum tables shown as dollar or percentage values
+SUMMARY_CURRENCY_COLUMNS = ["highestOptimization", "monthlySavings", "annualSavings", "amortizedCost"]
+SUMMARY_PERCENTAGE_COLUMNS = ["relationPotentialSavings"]
+SUM_CURRENCY_COLUMNS = ["monthly_saving_potential", "annual_savings_potential", "cost"]
+SUM_PERCENTAGE_COLUMNS = ["relation"]
+CURRENCY_FORMAT = '"$"0.00'
+PERCENTAGE_FORMAT = "0.00%"
+# Python equivalents of the number formats, used to measure column widths
+NUMBER_FORMATTERS = {
+    CURRENCY_FORMAT: "${:.2f}".format,
+    PERCENTAGE_FORMAT: "{:.2%}".format,
+}
+
+# Column widths are capped, and only a sample of the rows of large tables
+# is measured
+MAX_COLUMN_WIDTH = 100
+WIDTH_SAMPLE_ROWS = 10000
+HEADER_HEIGHT = 55
+HEADER_FILL = PatternFill(fill_type="solid", fgColor="ADD8E6")
+HEADER_ALIGNMENT = Alignment(wrap_text=True, vertical="top")
+
+# Row backgrounds: alternating white and grey groups, red terminate rows
+ROW_FILLS = [
+    PatternFill(fill_type="solid", fgColor="FFFFFF"),
+    PatternFill(fill_type="solid", fgColor="EBEBEB"),
+    PatternFill(fill_type="solid", fgColor="FFE0DF"),
+]
+TERMINATE_ROW = 2
+DATA_FONT = Font(color="000000")
+TERMINATE_FONT = Font(color="FF0000")
+
 medium_border = Border(left=Side(style='medium'),
                        right=Side(style='medium'),
                        top=Side(style='medium'),
                        bottom=Side(style='medium'))
 
 
-def color_terminate(df):
+def row_style_codes(df, group, highlight_terminate=False) -> np.ndarray:
     """
-    Change the background color of rows containing a terminate recommendation
-    to red.
+    Compute the background of every row in one pass over the group column.
+    Related recommendations alternate between white (0) and grey (1) for
+    readability reasons. Rows containing a terminate recommendation are
+    highlighted red (2) if requested.
+    Returns an array with one code of ROW_FILLS per row.
     """
-    x = df.copy()
-    x.loc[x['recommendations_action'] == "Terminate",
-          :] = 'background-color: #FFE0DF'
-    x.loc[x['recommendations_action'] == "Rightsize",
-          :] = None
-    return x
+    codes = pd.factorize(df[group])[0] % 2
+    if highlight_terminate:
+        codes = np.where(
+            df["recommendations_action"].to_numpy() == "Terminate", TERMINATE_ROW, codes)
+    return codes
 
 
-def format_color_groups(df, group):
+def terminate_cells(df) -> np.ndarray:
     """
-    Change the background color of related recommendations
-    alternatingly white and grey for readability reasons.
-    Returns a pandas Styler.
+    Boolean mask of the cells holding a terminate recommendation, which
+    are written in red.
     """
-    colors = ['white', '#ebebeb']
-    x = df.copy()
-    grouping_meta = list(x[group].unique())
-    i = 0
-    for group_item in grouping_meta:
-        style = f'background-color: {colors[i]}'
-        x.loc[x[group] == group_item, :] = style
-        i = not i
-    return x
+    mask = np.zeros(df.shape, dtype=bool)
+    for position in range(df.shape[1]):
+        column = df.iloc[:, position]
+        # Only text columns can hold the recommendation action
+        if column.dtype == object or isinstance(column.dtype, pd.CategoricalDtype):
+            mask[:, position] = (column == "Terminate").to_numpy()
+    return mask
 
 
-def humanize_summary_columns(df) -> pd.DataFrame:
+def apply_row_styles(worksheet, first_row, first_column, codes, terminate_mask):
     """
-    Rename columns to a human readable format
+    Style the cells of a table already written to the worksheet with the
+    fills of the row style codes and the terminate font.
     """
-    humanized_columns = {
-        **(GENERAL_SHEET_CONFIGURATION["column_mapping"]),
-    }
-    return df.rename(
-        columns=humanized_columns
+    if len(codes) == 0:
+        return
+    rows = worksheet.iter_rows(
+        min_row=first_row,
+        max_row=first_row + len(codes) - 1,
+        min_col=first_column,
+        max_col=first_column + terminate_mask.shape[1] - 1,
     )
+    for cells, code, row_mask in zip(rows, codes, terminate_mask):
+        fill = ROW_FILLS[code]
+        for cell, is_terminate in zip(cells, row_mask):
+            cell.fill = fill
+            cell.font = TERMINATE_FONT if is_terminate else DATA_FONT
+
+
+def column_number_formats(columns, currency_columns, percentage_columns) -> list:
+    """
+    Excel number format of every column. Columns that are neither dollar
+    nor percentage values get None and keep the default format.
+    """
+    number_formats = []
+    for column in columns:
+        if column in currency_columns:
+            number_formats.append(CURRENCY_FORMAT)
+        elif column in percentage_columns:
+            number_formats.append(PERCENTAGE_FORMAT)
+        else:
+            number_formats.append(None)
+    return number_formats
+
+
+def apply_number_formats(worksheet, first_row, first_column, row_count, number_formats):
+    """
+    Set the number formats of the columns of a table already written to
+    the worksheet, so the values stay numbers in Excel.
+    """
+    if row_count == 0:
+        return
+    for position, number_format in enumerate(number_formats):
+        if number_format is None:
+            continue
+        column = first_column + position
+        for (cell,) in worksheet.iter_rows(min_row=first_row, max_row=first_row + row_count - 1,
+                                           min_col=column, max_col=column):
+            cell.number_format = number_format
+
+
+def column_widths(
+    df,
+    headers,
+    number_formats=None,
+    max_width=MAX_COLUMN_WIDTH,
+    sample_rows=WIDTH_SAMPLE_ROWS,
+) -> list:
+    """
+    Width of every column based on the length of either the longest value
+    or a third of the header, depending of which is longer.
+    Values with a number format are measured as they are displayed.
+    Tables longer than sample_rows are measured on a sample of their rows.
+    Returns a list of widths in the order of the columns.
+    """
+    if number_formats is None:
+        number_formats = [None] * df.shape[1]
+    if sample_rows and len(df) > sample_rows:
+        df = df.sample(n=sample_rows, random_state=0)
+    widths = []
+    for position, (header, number_format) in enumerate(zip(headers, number_formats)):
+        values = df.iloc[:, position].dropna()
+        if values.empty:
+            width_values = 0
+        elif number_format in NUMBER_FORMATTERS:
+            # The longest formatted number is the one of the smallest or
+            # the largest value
+            formatter = NUMBER_FORMATTERS[number_format]
+            width_values = max(len(formatter(values.min())), len(formatter(values.max())))
+        else:
+            width_values = values.astype(str).str.len().max()
+        width = max(width_values, len(str(header)) / 3) + 5
+        widths.append(min(width, max_width))
+    return widths
+
+
+def apply_column_widths(worksheet, first_column, widths):
+    """
+    Set the widths of consecutive columns starting at first_column.
+    Works for write-only worksheets as long as no row was written yet.
+    """
+    for position, width in enumerate(widths):
+        worksheet.column_dimensions[get_column_letter(first_column + position)].width = width
+
+
+def write_table_header(worksheet, row, first_column, headers):
+    """
+    Write the header row of a table in light blue with borders.
+    """
+    worksheet.row_dimensions[row].height = HEADER_HEIGHT
+    for position, header in enumerate(headers):
+        cell = worksheet.cell(row=row, column=first_column + position, value=header)
+        cell.fill = HEADER_FILL
+        cell.alignment = HEADER_ALIGNMENT
+        cell.border = medium_border
+
+
+def humanize_summary_headers(columns) -> list:
+    """
+    Human readable names of the summary columns, without renaming a copy
+    of the dataframe.
+    """
+    humanized_columns = GENERAL_SHEET_CONFIGURATION["column_mapping"]
+    return [humanized_columns.get(column, column) for column in columns]
 
 
 def get_font(size: int = 10, color: str = "", bold=False):
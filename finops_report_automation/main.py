@@ -5,14 +5,35 @@
 
 import os
 import yaml
+from collections import deque
 from datetime import date
+from functools import partial
 import boto3
 import logging
 from .logger import create_logger
-from .aws import upload_to_s3
-from .api import Api
-from .project import create_cross_project_overview, create_projects
-from .utils import write_file, use_offline_data
+from .aws import UploadManager, download_raw_archive
+from .api import FETCH_WORKERS, Api, fetch_all
+from .cache import ResponseCache
+from .project import (
+    REPORT_FORMAT_VERSION,
+    REPORT_OUTPUT,
+    create_cross_project_overview,
+    create_project_id_mapping,
+    create_projects,
+    write_reports,
+)
+from .resource import ProductData, create_account_directory
+from .utils import (
+    archive_batches,
+    archive_extension,
+    archive_file_extension,
+    content_hash,
+    file_content_hash,
+    find_archive,
+    iter_json_array,
+    use_offline_data,
+    write_json,
+)
 
 
 USE_LOCAL_DATA = os.environ.get("USE_LOCAL_DATA") or False
@@ -22,6 +43,17 @@ PROJECT_NAMES_FILE = f"{os.environ.get('CONFIG_PATH', './config')}/accountMappin
 CONFIG_PATH = os.environ.get("CONFIG_PATH") or "./config"
 USE_OFFLINE_MODE = True
 BUCKET_NAME = os.environ.get("BUCKET_NAME") or False
+DISABLE_API_CACHE = os.environ.get("DISABLE_API_CACHE") or False
+# Upload every file to the folder of the day instead of storing it under
+# its content hash, see upload_run_file
+DISABLE_UPLOAD_DEDUP = os.environ.get("DISABLE_UPLOAD_DEDUP") or False
+# Raw API responses of this run, uploaded to <date>/raw_api/ in S3
+ARCHIVE_PATH = f"{REPORTINGS_PATH}/raw_api"
+# Directory of a previous raw API archive to create the reports from
+# instead of calling the API, or the folder of a day in S3, e.g.
+# s3://bucket/2022/05/12, whose archive is downloaded to REPLAY_PATH
+REPLAY_ARCHIVE = os.environ.get("REPLAY_ARCHIVE") or False
+REPLAY_PATH = f"{REPORTINGS_PATH}/replay_api"
 
 logger = create_logger()
 if DEBUG:
@@ -29,18 +61,62 @@ if DEBUG:
     logger.debug("Using debug mode.")
 
 
-def main():
+def fetch_product(api: Api, config: dict, archive_path: str) -> ProductData:
+    """
+    Page through the recommendations of a product. Every page is written
+    to the raw archive and normalized before the next one is requested.
+    """
+    batches = archive_batches(api.iter_rightsizing(config), archive_path)
+    return ProductData.from_batches(config["product"], batches)
 
-    s3_client = boto3.client("s3")
-    api = Api("https://api.cloudability.com")
 
-    if USE_LOCAL_DATA:
-        account_details = use_offline_data("./config/accounts.json")
-    else:
-        account_details = api.get_accounts()
+def load_offline_product(product: str, filepath: str) -> ProductData:
+    """
+    Normalize a product from a local json file. The records are streamed
+    from the file in batches instead of loading the whole document.
+    """
+    return ProductData.from_batches(product, iter_json_array(filepath))
+
+
+def archive_path(name: str) -> str:
+    return f"{ARCHIVE_PATH}/{name}_api{archive_extension()}"
+
+
+def fetch_archived(call, filepath: str):
+    """Call the API and write the response to the raw archive"""
+    data = call()
+    write_json(filepath, data)
+    return data
+
+
+def upload_run_file(uploads: UploadManager, local_file, name: str, extension: str,
+                    date_str: str, digest: str = None):
+    """
+    Queue the upload of a file of this run. local_file is a file path or
+    an in-memory buffer and name is the path of the file in the folder of
+    the day, e.g. "Project reports/project.xlsx".
+    The file is stored under the hash of its content and listed in the
+    index of the day, so files that did not change since the last run are
+    not uploaded again. Without a digest the content of the file is hashed.
+    Returns the future of the upload.
+    """
+    if DISABLE_UPLOAD_DEDUP:
+        logger.info(f"Uploading {name} to S3")
+        return uploads.upload(local_file, f"{date_str}/{name}")
+    if digest is None:
+        digest = file_content_hash(local_file)
+    logger.info(f"Uploading {name} to S3 if its content changed")
+    return uploads.upload_content(local_file, name, digest, extension)
+
+
+def main():
 
-    amortized_cost_raw = api.get_amortized_cost()
-    projects = create_projects(amortized_cost_raw)
+    # Files are uploaded in the background while the run goes on
+    uploads = None
+    if BUCKET_NAME != False:
+        uploads = UploadManager(boto3.client("s3"), BUCKET_NAME)
+    cache = None if DISABLE_API_CACHE else ResponseCache()
+    api = Api("https://api.cloudability.com", cache=cache)
 
     date_str = str(date.today()).replace("-", "/")
     config_list = []
@@ -49,43 +125,107 @@ def main():
         for c in config_iterator:
             config_list.append(c)
 
-    for config in config_list:
-        logger.debug(f"Handling {config['product']} data.")
+    # All requests are independent, so they are sent at the same time and
+    # processed in the order they complete. Every response is written to
+    # the raw archive. A replayed archive is listed in the index of this
+    # run again, without uploading it again.
+    calls = {}
+    archives = {}
+    replay_folder = REPLAY_ARCHIVE
+    if REPLAY_ARCHIVE and REPLAY_ARCHIVE.startswith("s3://"):
+        bucket, _, prefix = REPLAY_ARCHIVE[len("s3://"):].partition("/")
+        replay_folder = download_raw_archive(
+            boto3.client("s3"), bucket, prefix.strip("/"), REPLAY_PATH)
+    if REPLAY_ARCHIVE:
+        logger.info(f"Replaying the raw API archive {REPLAY_ARCHIVE}")
+        for name in ["accounts", "amortized_cost"]:
+            archives[name] = find_archive(replay_folder, name)
+            calls[name] = partial(use_offline_data, archives[name])
+    else:
+        os.makedirs(ARCHIVE_PATH, exist_ok=True)
+        archives["amortized_cost"] = archive_path("amortized_cost")
+        calls["amortized_cost"] = partial(
+            fetch_archived, api.get_amortized_cost, archives["amortized_cost"])
         if USE_LOCAL_DATA:
-            api_data = use_offline_data(
-                f"{REPORTINGS_PATH}/output_{config['product']}.json")
+            calls["accounts"] = partial(use_offline_data, "./config/accounts.json")
         else:
-            api_data = api.get_rightsizing(config)
-            filepath_api = write_file(f"{REPORTINGS_PATH}/{config['product']}_api.json", str(api_data))
-            if BUCKET_NAME != False:
-                logger.info(f"Uploading {config['product']}_api.json to S3")
-                upload_to_s3(s3_client, filepath_api, f"{date_str}/raw_api/{config['product']}_api.json")
-            for project in projects:
-                logger.debug(f"Appending {config['product']} to {project}")
-                project.append_resource(
-                    config["product"],
-                    api_data["result"],
-                    project.account_ids,
-                    account_details["result"]
-                    )
-
-    # Final report writing
+            archives["accounts"] = archive_path("accounts")
+            calls["accounts"] = partial(fetch_archived, api.get_accounts, archives["accounts"])
+    for config in config_list:
+        product = config["product"]
+        if REPLAY_ARCHIVE:
+            archives[("product", product)] = find_archive(replay_folder, product)
+            calls[("product", product)] = partial(
+                load_offline_product, product, archives[("product", product)])
+        elif USE_LOCAL_DATA:
+            calls[("product", product)] = partial(
+                load_offline_product, product, f"{REPORTINGS_PATH}/output_{product}.json")
+        else:
+            archives[("product", product)] = archive_path(product)
+            calls[("product", product)] = partial(
+                fetch_product, api, config, archives[("product", product)])
+
+    product_data = {}
+    for key, result in fetch_all(calls, FETCH_WORKERS):
+        if key == "accounts":
+            account_directory = create_account_directory(result["result"])
+        elif key == "amortized_cost":
+            projects = create_projects(result)
+        else:
+            logger.debug(f"Fetched {key[1]} data.")
+            product_data[key[1]] = result
+        if key in archives and uploads is not None:
+            name = key if isinstance(key, str) else key[1]
+            extension = archive_file_extension(archives[key])
+            upload_run_file(uploads, archives[key], f"raw_api/{name}_api{extension}",
+                            extension, date_str)
+
+    # Resources are appended in the order of the configuration, so the
+    # sheets of the reports do not depend on which request finished first
+    for config in config_list:
+        for project in projects:
+            logger.debug(f"Appending {config['product']} to {project}")
+            project.append_product(product_data[config["product"]], account_directory)
+
+    # Final report writing. Reports kept in memory are uploaded from their
+    # buffers, the others from the written files.
+    output = REPORT_OUTPUT
+    if uploads is None and output == "memory":
+        logger.warning("No BUCKET_NAME to upload the reports to, writing them to disk instead.")
+        output = "disk"
     dataframes_list = []
-    for project in projects:
-        if len(project.resources) > 0:
-            dataframes_list.append(project.summary)
-        filepath_projects = project.write_report(f"{REPORTINGS_PATH}")
-        if len(filepath_projects) > 0 and BUCKET_NAME != False:
-            logger.info(f"Uploading {project.name}.xlsx to S3")
-            upload_to_s3(s3_client, filepath_projects, f"{date_str}/Project reports/{project.name}.xlsx")
+    # Every report is queued for upload as soon as it is written. A buffer
+    # is dropped once its upload finished, so only about UPLOAD_WORKERS
+    # reports are kept in memory.
+    buffer_uploads = deque()
+    reports = write_reports(projects, f"{REPORTINGS_PATH}", output=output)
+    for project, (filepath_projects, summary, digest, buffer) in reports:
+        if summary is None:
+            continue
+        dataframes_list.append(summary)
+        if uploads is None:
+            continue
+        future = upload_run_file(uploads, buffer if buffer is not None else filepath_projects,
+                                 f"Project reports/{project.name}.xlsx", ".xlsx", date_str, digest)
+        if buffer is not None:
+            buffer_uploads.append(future)
+            while len(buffer_uploads) > uploads.workers:
+                buffer_uploads.popleft().result()
         
-    filepath_summary = create_cross_project_overview(dataframes_list)
-    filepath_amortized_cost = write_file(f"{REPORTINGS_PATH}/amortized_cost_api.json", str(amortized_cost_raw))
-    if BUCKET_NAME != False:
-        logger.info(f"Uploading amortized_cost_api.json to S3")
-        upload_to_s3(s3_client, filepath_amortized_cost, f"{date_str}/raw_api/amortized_cost_api.json")
-        logger.info(f"Uploading cross_project_overview.xlsx to S3")
-        upload_to_s3(s3_client, filepath_summary, f"{date_str}/cross_project_overview.xlsx")
+    filepath_summary, buffer = create_cross_project_overview(dataframes_list, output=output)
+    if uploads is not None:
+        digest = content_hash(
+            [create_project_id_mapping()] + dataframes_list, [REPORT_FORMAT_VERSION])
+        upload_run_file(uploads, buffer if buffer is not None else filepath_summary,
+                        "cross_project_overview.xlsx", ".xlsx", date_str, digest)
+        results = uploads.wait()
+        skipped = sum(result.skipped for result in results)
+        logger.info(
+            f"Uploaded {sum(result.ok for result in results) - skipped} of {len(results)} "
+            f"files to S3, {skipped} did not change")
+        if not DISABLE_UPLOAD_DEDUP:
+            uploads.write_index(f"{date_str}/index.json", date=str(date.today()))
+        uploads.raise_for_failures()
 
     logger.info("Finished creating & uploading reports.")
 
@@ -6,10 +6,49 @@ recommendation messages in a human readable form
 :copyright: 2022 Liquid Reply GmbH
 """
 
+from functools import lru_cache
+from string import Formatter
 from .resource import Resource
 import pandas as pd
 
 
+@lru_cache(maxsize=None)
+def template_fields(template: str) -> tuple:
+    """
+    Parse a message template once and return the names of its fields.
+    """
+    return tuple(
+        field_name for _, field_name, _, _ in Formatter().parse(template)
+        if field_name is not None
+    )
+
+
+def render_messages(templates: dict, columns: dict, counts: list) -> list:
+    """
+    Render the "one" or "moreThanOne" template for every row at once.
+    The columns dictionary maps every template field to the list of its
+    values, so no row objects have to be created.
+    Returns a list of messages.
+    """
+    fields = tuple(dict.fromkeys(
+        template_fields(templates["one"]) + template_fields(templates["moreThanOne"])
+    ))
+    rows = zip(*[columns[field] for field in fields])
+    return [
+        (templates["one"] if count == 1 else templates["moreThanOne"]).format_map(
+            dict(zip(fields, values)))
+        for count, values in zip(counts, rows)
+    ]
+
+
+def message_columns(df: pd.DataFrame, templates: dict) -> dict:
+    """
+    Extract the values of all template fields available on the dataframe.
+    """
+    fields = template_fields(templates["one"]) + template_fields(templates["moreThanOne"])
+    return {field: df[field].tolist() for field in fields if field in df.columns}
+
+
 def label(resource: Resource, df: pd.DataFrame, action) -> pd.DataFrame:
     """
     Convert the recommendation dataframe with multiple columns to a single column in human readable form.
@@ -21,34 +60,23 @@ def label(resource: Resource, df: pd.DataFrame, action) -> pd.DataFrame:
     templates = resource.configuration["messages"][action]
     if df.empty:
         return pd.DataFrame({"message": [templates['zero']]})
-    for i, row in df.iterrows():
-        row_dict = row.to_dict()
-        if row['count'] == 1:
-            message = templates["one"].format(**row_dict)
-        elif row['count'] > 1:
-            message = templates["moreThanOne"].format(**row_dict)
-        df.at[i, 'message'] = message
-    return pd.DataFrame(df['message'])
+    columns = message_columns(df, templates)
+    messages = render_messages(templates, columns, df["count"].tolist())
+    return pd.DataFrame({"message": messages}, index=df.index)
 
 
 def label_rds(resource: Resource, df: pd.DataFrame, action) -> pd.DataFrame:
     """
     Convert the recommendation dataframe with multiple columns to a single column in human readable form.
     This function is for RDS resources.
-    Returns a dataframe.    
+    Returns a dataframe.
     """
     templates = resource.configuration["messages"][action]
     template_message = resource.configuration["messages"]["storage_message"]
     if df.empty:
         return pd.DataFrame({"message": [templates['zero']]})
-    for i, row in df.iterrows():
-        row_dict = row.to_dict()
-        row_dict["storage"] = template_message[row_dict["storagerecommendations_action"].lower(
-        ).replace(" ", "")]
-        if row['count'] == 1:
-            message = templates["one"].format(**row_dict)
-        elif row['count'] > 1:
-            message = templates["moreThanOne"].format(**row_dict)
-
-        df.at[i, 'message'] = message
-    return pd.DataFrame(df['message'])
+    columns = message_columns(df, templates)
+    columns["storage"] = df["storagerecommendations_action"].str.lower().str.replace(
+        " ", "", regex=False).map(template_message).tolist()
+    messages = render_messages(templates, columns, df["count"].tolist())
+    return pd.DataFrame({"message": messages}, index=df.index)
@@ -9,29 +9,82 @@ report (contains multiple sheets) for a specific project
 """
 
 
-from copy import deepcopy
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import io
+import multiprocessing
 import os
 import pandas as pd
 
-from finops_report_automation.resource import Resource
+from finops_report_automation.resource import ProductData, Resource
+from .account_mapping import AccountMapping, load_account_mapping
 from .excel_writer import write_resource_sheet, write_summary_sheet, write_cross_project_sheet
+from .excel_stream_writer import write_cross_project_workbook, write_project_workbook
 from .messages_helper import label
 from .constants import GENERAL_SHEET_CONFIGURATION
+from .utils import content_hash
 
 CONFIG_PATH = os.environ.get("CONFIG_PATH") or "./config"
 REPORTINGS_PATH = os.environ.get("REPORTINGS_PATH", "./reports")
+# Number of processes writing project reports in parallel
+REPORT_WORKERS = int(os.environ.get("REPORT_WORKERS") or 1)
+# The report workers are not forked from the main process, which still runs
+# upload and API threads whose locks a forked worker could inherit held
+REPORT_START_METHOD = (
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+# Library used to write the excel files. "openpyxl" builds every workbook in
+# memory, "streaming" writes the rows straight to the file.
+EXCEL_BACKEND = os.environ.get("EXCEL_BACKEND") or "openpyxl"
+EXCEL_BACKENDS = ["openpyxl", "streaming"]
+# Where the reports are written to. "disk" writes the files to
+# REPORTINGS_PATH, "memory" keeps them in buffers that are uploaded without
+# touching the disk and "both" does both.
+REPORT_OUTPUT = os.environ.get("REPORT_OUTPUT") or "disk"
+REPORT_OUTPUTS = ["disk", "memory", "both"]
+# Part of the content hash of the reports. Increase it when the layout of
+# the reports changes, so unchanged data is uploaded again in the new layout.
+REPORT_FORMAT_VERSION = 1
 
 
 class Project:
-    def __init__(self, name, account_ids, amortized_costs_raw):
+    def __init__(self, name, account_ids, amortized_costs_raw, amortized_costs=None):
         self.name = name
         self.account_ids = account_ids
         self.amortized_costs_raw = amortized_costs_raw
         self.resources = []
-        self.amortized_costs_df = self.json_to_dataframe()
-        self.summary = pd.DataFrame
-        self.sum = pd.DataFrame
+        # The parsed costs are usually shared between all projects,
+        # see create_projects
+        if amortized_costs is None:
+            amortized_costs = create_amortized_cost_index(amortized_costs_raw)
+        self.amortized_costs = amortized_costs
+        # Summaries are computed lazily on first access. The summary rows of
+        # every resource are kept, so appending a resource only summarizes
+        # the new one.
+        self._summary = None
+        self._sum = None
+        self._resource_summaries = {}
 
+    def __getstate__(self):
+        # Projects are sent to the report workers. The raw costs were
+        # already parsed and only the costs of the own accounts are needed.
+        state = self.__dict__.copy()
+        state["amortized_costs_raw"] = None
+        state["amortized_costs"] = self.amortized_costs[
+            self.amortized_costs.index.isin(self.account_ids)]
+        return state
+
+    @property
+    def summary(self) -> pd.DataFrame:
+        if self._summary is None:
+            self.create_summary()
+        return self._summary
+
+    @property
+    def sum(self) -> pd.DataFrame:
+        if self._sum is None:
+            self.sum_all_accounts()
+        return self._sum
 
     def __str__(self):
         return f"""
@@ -47,104 +100,136 @@ class Project:
             account_ids,
             account_details
         )
+        self.add_resource(resource)
+
+    def append_product(self, product_data: ProductData, account_directory: pd.Series):
+        """
+        Same as append_resource, but reuses the already normalized API data
+        and the account directory shared between all projects.
+        """
+        resource = Resource(
+            product_data.name,
+            product_data.raw_data,
+            self.account_ids,
+            account_details=None,
+            product_data=product_data,
+            account_directory=account_directory
+        )
+        self.add_resource(resource)
+
+    def add_resource(self, resource: Resource):
         if not resource.df.empty:
             self.resources.append(resource)
-            self.create_summary()
-            self.sum_all_accounts()
+            self._summary = None
+            self._sum = None
 
-    def write_report(self, dst_folder: str) -> str:
+    def write_report(self, dst_folder: str, backend: str = EXCEL_BACKEND) -> str:
         """
         This functions calls the write functions for both the individual
         resource sheets (EC2, RDS, EBS, S3) as well as the summary sheet.
         """
+        check_excel_backend(backend)
         if len(self.resources) >= 1:
             filename = f"{dst_folder}/{self.name}.xlsx"
-            with pd.ExcelWriter(filename, mode="w") as writer:
-                write_summary_sheet(
-                    writer, "General", self.name, self.summary, self.sum,
-                )
-                for resource in self.resources:
-                    write_resource_sheet(
-                        writer, resource.name.upper(), resource
-                    )
+            self.render_report(filename, backend)
             return filename
         return ""
 
-    def json_to_dataframe(self) -> pd.DataFrame:
+    def render_report(self, file, backend: str = EXCEL_BACKEND):
         """
-        Parse the raw json data from the API to a dataframe.
-        Returns a dataframe.
+        Write the report to a file path or a binary file object, e.g. a
+        BytesIO buffer.
         """
-        df = pd.json_normalize(
-            self.amortized_costs_raw,
-            "dimensions"
-        )
-        df2 = pd.json_normalize(
-            self.amortized_costs_raw,
-            "metrics",
-        )
-        df = df.merge(df2["sum"], right_index=True, left_index=True)
-        df[0] = df[0].apply(lambda x: x.replace('-', ''))
-        return df
+        check_excel_backend(backend)
+        if backend == "streaming":
+            write_project_workbook(
+                file, self.name, self.summary, self.sum, self.resources)
+            return
+        with pd.ExcelWriter(file, engine="openpyxl", mode="w") as writer:
+            write_summary_sheet(
+                writer, "General", self.name, self.summary, self.sum,
+            )
+            for resource in self.resources:
+                write_resource_sheet(
+                    writer, resource.name.upper(), resource
+                )
+
+    def content_hash(self) -> str:
+        """
+        Hash of the data shown in the report of the project. The report
+        embeds the date it was written on, so its file differs every day
+        even when the hash, and therefore the content, is the same.
+        """
+        frames = [self.summary, self.sum] + [resource.df for resource in self.resources]
+        labels = [REPORT_FORMAT_VERSION, self.name] + [resource.name for resource in self.resources]
+        return content_hash(frames, labels)
 
-    def add_summary_row(self, amortized_cost, resource_type, account_id, action) -> list:
+    def summarize_resource(self, resource_type: Resource) -> pd.DataFrame:
         """
-        Create a single row for the summary sheet.
-        Returns a list ready to be appended to a dataframe
+        Creates the summary rows of a single resource with one grouped
+        aggregation per action instead of filtering every account.
+        Returns a dataframe with the summary page columns.
         """
-        summary = []
-        df = resource_type.df.loc[resource_type.df["recommendations_action"] == action]
-        df = df.loc[df["vendorAccountId"] == account_id]
-        resource_copy = deepcopy(resource_type)
-        resource_copy.df = df
-        if df.empty:
-            return []
-        message_df = label(
-            resource_copy, resource_copy.recommendation_summary(action.lower()), action.lower())
-        message_str = message_df["message"].iloc[0]
+        cols = list(GENERAL_SHEET_CONFIGURATION["column_mapping"].keys())
         saving_column = "recommendations_savings"
-        if resource_copy.name == "rds":
+        if resource_type.name == "rds":
             saving_column = "topSavings"
-        best_recommendation_savings = resource_copy.get_best_recommendation(df)[
-            saving_column].values[0]
-        monthly_savings = df[saving_column].sum()
-        annual_savings = monthly_savings * 12
-        account_name = df.loc[df['vendorAccountId'] ==
-                              account_id]['vendorAccountName'].values[0]
-
-        summary = [
-            account_id,
-            account_name,
-            resource_type.name.upper(),
-            action,
-            float(best_recommendation_savings),
-            float(monthly_savings),
-            float(annual_savings),
-            float(amortized_cost),
-            (float(monthly_savings)/float(amortized_cost)),
-            message_str
-        ]
-        return summary
+        frames = []
+        for action in ["Terminate", "Rightsize"]:
+            df = resource_type.df.loc[resource_type.df["recommendations_action"] == action]
+            if df.empty:
+                continue
+            # Count, best recommendation and message per account
+            recommendations = resource_type.recommendation_summary(action.lower())
+            messages = label(resource_type, recommendations, action.lower())
+            recommendations = recommendations.set_index("vendorAccountId")
+            recommendations["message"] = messages["message"].values
+
+            grouped = df.groupby("vendorAccountId", sort=False)
+            summary_df = pd.DataFrame({
+                "vendorAccountName": grouped["vendorAccountName"].first(),
+                "monthlySavings": grouped[saving_column].sum().astype(float),
+            })
+            summary_df["highestOptimization"] = recommendations[saving_column].astype(float)
+            summary_df["message"] = recommendations["message"]
+
+            # Keep the order of the account ids of the project
+            account_ids = [
+                account_id for account_id in self.account_ids
+                if account_id in summary_df.index
+            ]
+            summary_df = summary_df.loc[account_ids]
+            summary_df["vendorAccountId"] = summary_df.index
+            summary_df["name"] = resource_type.name.upper()
+            summary_df["recommendations_action"] = action
+            summary_df["annualSavings"] = summary_df["monthlySavings"] * 12
+            summary_df["amortizedCost"] = self.amortized_costs.loc[account_ids].values
+            summary_df["relationPotentialSavings"] = (
+                summary_df["monthlySavings"] / summary_df["amortizedCost"])
+            frames.append(summary_df[cols])
+
+        if len(frames) == 0:
+            return pd.DataFrame(columns=cols)
+        return pd.concat(frames, ignore_index=True)
 
     def create_summary(self):
         """
         Creates the summary page of the report based on the
-        resources listed on this instance.
-        Returns a dataframes ready for writing to an excel file.
+        resources listed on this instance. Resources that were already
+        summarized are not processed again.
         """
         cols = GENERAL_SHEET_CONFIGURATION["column_mapping"].keys()
-        summary_df = pd.DataFrame(columns=cols)
+        frames = []
         for resource_type in self.resources:
-            for action in ["Terminate", "Rightsize"]:
-                for account_id in self.account_ids:
-                    if resource_type.df['vendorAccountId'].isin([account_id]).any().any():
-                        amortized_cost = self.amortized_costs_df.loc[
-                            self.amortized_costs_df[0] == account_id]['sum'].values[0]
-                        row = self.add_summary_row(
-                            amortized_cost, resource_type, account_id, action)
-                        if len(row) > 0:
-                            summary_df.loc[len(summary_df)] = row
-        self.summary = summary_df
+            if resource_type not in self._resource_summaries:
+                self._resource_summaries[resource_type] = self.summarize_resource(
+                    resource_type)
+            if not self._resource_summaries[resource_type].empty:
+                frames.append(self._resource_summaries[resource_type])
+        if len(frames) == 0:
+            self._summary = pd.DataFrame(columns=cols)
+        else:
+            self._summary = pd.concat(frames, ignore_index=True)
 
 
     def sum_all_accounts(self):
@@ -153,60 +238,167 @@ class Project:
         cost and cost to savings relation per project.
         Returns a dataframe.
         """     
-        relevant_account_ids = []
-        for account_id in self.account_ids:
-            for resource_type in self.resources:
-                if resource_type.df['vendorAccountId'].isin([account_id]).any().any():
-                    relevant_account_ids.append(account_id)
-        amortized_cost = self.amortized_costs_df.loc[self.amortized_costs_df[0].isin(
-            relevant_account_ids)]
-        cost = amortized_cost['sum'].astype(float).sum()
+        resource_account_ids = set()
+        for resource_type in self.resources:
+            resource_account_ids.update(resource_type.df["vendorAccountId"])
+        relevant_account_ids = [
+            account_id for account_id in self.account_ids
+            if account_id in resource_account_ids
+        ]
+        cost = self.amortized_costs[
+            self.amortized_costs.index.isin(relevant_account_ids)].sum()
 
         annual_savings_potential = self.summary["annualSavings"].sum()
         monthly_saving_potential = self.summary["monthlySavings"].sum()
         relation = float(monthly_saving_potential) / float(cost)
         df = pd.DataFrame([[monthly_saving_potential, annual_savings_potential, cost, relation]], columns=[
                           "monthly_saving_potential", "annual_savings_potential", "cost", "relation"])
-        self.sum = df
+        self._sum = df
+
+
+def check_excel_backend(backend: str):
+    if backend not in EXCEL_BACKENDS:
+        raise ValueError(
+            f"Unknown excel backend {backend}, expected one of {EXCEL_BACKENDS}")
+
+
+def check_report_output(output: str):
+    if output not in REPORT_OUTPUTS:
+        raise ValueError(
+            f"Unknown report output {output}, expected one of {REPORT_OUTPUTS}")
+
+
+def save_report(render, filepath: str, output: str = REPORT_OUTPUT) -> tuple:
+    """
+    Write a report with render(file) to the file path, to a buffer or
+    both, depending on the output. With both the report is rendered once
+    and the buffer is written to the file.
+    Returns the file path (empty if nothing was written to disk) and the
+    buffer rewound to its start (None if the report is not kept in memory).
+    """
+    check_report_output(output)
+    if output == "disk":
+        render(filepath)
+        return filepath, None
+    buffer = io.BytesIO()
+    render(buffer)
+    if output == "memory":
+        filepath = ""
+    else:
+        with open(filepath, "wb") as file:
+            file.write(buffer.getbuffer())
+    buffer.seek(0)
+    return filepath, buffer
+
+
+def create_amortized_cost_index(amortized_costs_raw) -> pd.Series:
+    """
+    Parse the raw amortized cost rows of the API into the cost per account.
+    Dashes are removed from the account ids.
+    Returns a series of floats indexed by account id.
+    """
+    account_ids = [row["dimensions"][0].replace("-", "") for row in amortized_costs_raw]
+    costs = [float(row["metrics"][0]["sum"]) for row in amortized_costs_raw]
+    amortized_costs = pd.Series(costs, index=account_ids, dtype=float)
+    return amortized_costs[~amortized_costs.index.duplicated()]
 
 
 def create_project_id_mapping() -> pd.DataFrame:
     """
     Create Dataframe from static account mapping.
+    The mapping file is only parsed once, see load_account_mapping.
     """
-    df = pd.read_excel(
-        f"{CONFIG_PATH}/accountMapping.xlsx",
-        names=["projectName", "vendorAccountId"],
-        skiprows=2,
-        usecols="A:B",
-        header=None,
-    )
-    return df
-
-def create_projects(amortized_cost_raw):
+    return load_account_mapping().df
+
+def create_projects(amortized_cost_raw, mapping: AccountMapping = None):
     """
     Create class Project instances.
+    The configured account mapping is used if no mapping is given.
     """
     projects = []
-    df = create_project_id_mapping()
-    # Extract unique project names
-    for name in df["projectName"].unique():
-        # Hacky way to mimic dict behaviour. Improvements?
-        account_ids = df.loc[df["projectName"] == name]["vendorAccountId"].to_list()
-        projects.append(Project(name, account_ids, amortized_cost_raw["rows"]))
+    if mapping is None:
+        mapping = load_account_mapping()
+    # Parse the amortized costs only once for all projects
+    amortized_costs = create_amortized_cost_index(amortized_cost_raw["rows"])
+    for name, account_ids in mapping.project_accounts.items():
+        projects.append(
+            Project(name, account_ids, amortized_cost_raw["rows"], amortized_costs))
 
     return projects
 
-def create_cross_project_overview(dataframes_list) -> str:
+
+def write_project_report(project: Project, dst_folder: str, output: str = REPORT_OUTPUT) -> tuple:
+    """
+    Write the report of a single project. Used as the worker function of
+    write_reports, so it has to stay a module level function.
+    Returns the file path (empty if nothing was written to disk), the
+    summary, the content hash and the buffer of the report, see save_report.
+    Projects without resources have no report.
+    """
+    if len(project.resources) == 0:
+        return "", None, None, None
+    filepath, buffer = save_report(
+        project.render_report, f"{dst_folder}/{project.name}.xlsx", output)
+    return filepath, project.summary, project.content_hash(), buffer
+
+
+def write_reports(projects: list, dst_folder: str, workers: int = REPORT_WORKERS,
+                  output: str = REPORT_OUTPUT):
+    """
+    Write the reports of all projects. With more than one worker the
+    summaries and excel files are created in a process pool, otherwise
+    serially in this process. Both ways run the same code.
+    Yields a (project, (file path, summary, content hash, buffer)) tuple
+    as soon as the report of a project is written, in the order of
+    projects, so the report can be uploaded while the next ones are written.
+    At most twice as many reports as workers are queued, so finished
+    reports do not pile up while the caller is busy with earlier ones.
+    """
+    check_report_output(output)
+    if workers <= 1 or len(projects) <= 1:
+        for project in projects:
+            yield project, write_project_report(project, dst_folder, output)
+        return
+    context = multiprocessing.get_context(REPORT_START_METHOD)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        pending = deque()
+        for project in projects:
+            pending.append(
+                (project, executor.submit(write_project_report, project, dst_folder, output)))
+            if len(pending) > 2 * workers:
+                project, future = pending.popleft()
+                yield project, future.result()
+        while len(pending) > 0:
+            project, future = pending.popleft()
+            yield project, future.result()
+
+
+def render_cross_project_overview(file, summary: pd.DataFrame, backend: str = EXCEL_BACKEND):
+    """Write the cross project overview to a file path or a binary file object"""
+    if backend == "streaming":
+        write_cross_project_workbook(file, summary)
+        return
+    with pd.ExcelWriter(file, engine="openpyxl", mode="w") as writer:
+        write_cross_project_sheet(writer, "General", summary)
+
+
+def create_cross_project_overview(dataframes_list, backend: str = EXCEL_BACKEND,
+                                  output: str = REPORT_OUTPUT,
+                                  mapping: AccountMapping = None) -> tuple:
     """
     Creates and writes the cross project overview. 
+    The configured account mapping is used if no mapping is given.
+    Returns the file path and the buffer of the overview, see save_report.
     """
+    check_excel_backend(backend)
     cross_project_summary = pd.concat(dataframes_list)
-    project_id_df = create_project_id_mapping()
+    if mapping is None:
+        project_id_df = create_project_id_mapping()
+    else:
+        project_id_df = mapping.df
     cross_project_summary = project_id_df.merge(cross_project_summary, on="vendorAccountId")
     filepath = f"{REPORTINGS_PATH}/cross_project_overview.xlsx"
-
-    with pd.ExcelWriter(filepath, mode="w") as writer:
-        write_cross_project_sheet(writer, "General", cross_project_summary)
-    return filepath
+    render = partial(
+        render_cross_project_overview, summary=cross_project_summary, backend=backend)
+    return save_report(render, filepath, output)
 
@@ -10,6 +10,11 @@ ec2 = Resource("ec2", raw_data, account_ids)
 affected_accounts = ec2.get_affected_accounts()
 termination = ec2.recommendation_summary(action="terminate")
 rightsizing = ec2.recommendation_summary(action="rightsize")
+
+# Normalize the API response once and share it between several projects
+ec2_data = ProductData("ec2", raw_data)
+accounts = create_account_directory(account_details)
+ec2 = Resource("ec2", raw_data, account_ids, account_details, ec2_data, accounts)
 ```
 
 :license: AGPL v3, see LICENSE for more details
@@ -20,6 +25,118 @@ from .constants import (
     EC2_CONFIGURATION, RDS_CONFIGURATION, S3_CONFIGURATION, EBS_CONFIGURATION
 )
 
+RESOURCE_CONFIGURATIONS = {
+    "ec2": EC2_CONFIGURATION,
+    "s3": S3_CONFIGURATION,
+    "rds": RDS_CONFIGURATION,
+    "ebs": EBS_CONFIGURATION,
+}
+
+
+def normalize_recommendations(name, raw_data: list) -> pd.DataFrame:
+    """
+    Flatten the raw json data of a product into one row per recommendation.
+    No account filtering or column selection is applied here, so the result
+    can be shared between all projects.
+    """
+    configuration = RESOURCE_CONFIGURATIONS[name]
+    cols = list(configuration["column_mapping"].keys())
+    # This line flattens out the recommendation object.
+    df = pd.json_normalize(
+        raw_data,
+        record_path="recommendations",
+        meta=cols,
+        record_prefix="recommendations_",
+        sep="_"
+    )
+    # Rds resources have two recommendation objects
+    # So we must normalize both of the resources
+    if name == "rds":
+        df2 = pd.json_normalize(
+            raw_data,
+            record_path="storageRecommendations",
+            meta=cols,
+            record_prefix="storagerecommendations_",
+            sep="_"
+        )
+        df = df.merge(df2, how="outer", on=cols)
+        df = df.fillna({"storagerecommendations_action": "No Action"})
+    return df
+
+
+def create_account_directory(account_details: list) -> pd.Series:
+    """
+    Index the account names returned by the Accounts API by account id.
+    The directory is the same for the whole run, so it should be created
+    once and shared between all resources.
+    Returns a categorical series of account names.
+    """
+    account_ids = [account.get("vendorAccountId") for account in account_details]
+    account_names = [account.get("vendorAccountName") for account in account_details]
+    account_directory = pd.Series(
+        account_names,
+        index=pd.Index(account_ids, name="vendorAccountId"),
+        name="vendorAccountName",
+        dtype="category"
+    )
+    return account_directory[~account_directory.index.duplicated()]
+
+
+class ProductData:
+    """
+    Normalized API response of a single product (ec2, ebs, s3 or rds).
+    The payload is flattened once per run and partitioned by account id, so
+    every project only picks the partitions of its own accounts.
+    """
+
+    def __init__(self, name, raw_data: list) -> None:
+        self.name = name
+        self.raw_data = raw_data
+        self.df = normalize_recommendations(name, raw_data)
+        self.partitions = self.partition_by_account()
+
+    @classmethod
+    def from_batches(cls, name, batches) -> "ProductData":
+        """
+        Normalize the API response page by page, e.g. from
+        Api.iter_rightsizing. Only the current page of raw records is held
+        in memory, the raw data is not kept.
+        """
+        frames = [normalize_recommendations(name, batch) for batch in batches]
+        product_data = cls.__new__(cls)
+        product_data.name = name
+        product_data.raw_data = None
+        if len(frames) == 0:
+            product_data.df = normalize_recommendations(name, [])
+        else:
+            product_data.df = pd.concat(frames, ignore_index=True)
+        product_data.partitions = product_data.partition_by_account()
+        return product_data
+
+    def partition_by_account(self) -> dict:
+        """Split the normalized dataframe into one dataframe per account id"""
+        if "vendorAccountId" not in self.df.columns:
+            return {}
+        return {
+            account_id: df
+            for account_id, df in self.df.groupby("vendorAccountId", sort=False)
+        }
+
+    def select(self, account_ids: list) -> pd.DataFrame:
+        """
+        Return the rows of the given account ids in their original order.
+        An empty list selects all accounts.
+        """
+        if len(account_ids) == 0:
+            return self.df
+        frames = [
+            self.partitions[account_id] for account_id in account_ids
+            if account_id in self.partitions
+        ]
+        if len(frames) == 0:
+            return self.df.iloc[0:0]
+        return pd.concat(frames).sort_index()
+
 
 class Resource:
     def __init__(
@@ -27,33 +144,55 @@ class Resource:
         name,
         raw_data: list,
         account_ids: list,
-        account_details
+        account_details,
+        product_data: ProductData = None,
+        account_directory: pd.Series = None
     ) -> None:
         self.name = name
         self.raw_data = raw_data
         self.account_ids = account_ids
         self.account_details = account_details
+        self.product_data = product_data
+        if account_directory is None:
+            account_directory = create_account_directory(account_details)
+        self.account_directory = account_directory
         self.configuration = self.configure_resource()
         # self.recommendation = self.configure_recommendation()
         self.df = self.json_to_dataframe()
 
+    def __getstate__(self):
+        # The raw API data is only needed to build the dataframe. Leave it
+        # out when resources are sent to other processes, together with the
+        # names of the accounts without recommendations.
+        state = self.__dict__.copy()
+        state["raw_data"] = None
+        state["product_data"] = None
+        state["account_details"] = None
+        account_directory = self.account_directory[
+            self.account_directory.index.isin(self.df["vendorAccountId"])]
+        state["account_directory"] = account_directory.cat.remove_unused_categories()
+        return state
+
+    @property
+    def df(self) -> pd.DataFrame:
+        return self._df
+
+    @df.setter
+    def df(self, df: pd.DataFrame):
+        self._df = df
+        # Summaries cached for the previous dataframe are no longer valid
+        self._recommendation_summaries = {}
+
     def configure_resource(self) -> dict:
         """
         Configures the group_by, column selection and text choices based on
         the resource name
         """
-        if self.name == "ec2":
-            return EC2_CONFIGURATION
-        elif self.name == "s3":
-            return S3_CONFIGURATION
-        elif self.name == "rds":
-            return RDS_CONFIGURATION
-        elif self.name == "ebs":
-            return EBS_CONFIGURATION
+        return RESOURCE_CONFIGURATIONS.get(self.name)
 
-    def humanize_columns(self) -> pd.DataFrame:
+    def humanized_column_mapping(self) -> dict:
         """
-        Rename the columns to a human readable format.
+        Human readable names of the columns.
         The human names of the colums are configured in the constants.py
         """
         humanized_columns = {
@@ -64,16 +203,23 @@ class Resource:
         if self.name == "rds":
             humanized_columns.update(
                 {**(self.configuration["storageRecommendation_mapping"])})
+        return humanized_columns
 
-        return self.df.rename(
-            columns=humanized_columns
-        )
+    def humanized_headers(self) -> list:
+        """
+        Human readable names of the columns in the order of the dataframe,
+        without renaming a copy of the dataframe.
+        """
+        humanized_columns = self.humanized_column_mapping()
+        return [humanized_columns.get(column, column) for column in self.df.columns]
 
     def json_to_dataframe(self) -> pd.DataFrame:
         """
         Parse the raw json data from the API to a dataframe.
         Not all data from the API response is relevant.
         This method uses only the entries defined in the constants mapping.
+        If the resource was created from a shared ProductData only the
+        partitions of the own accounts are used instead of normalizing again.
         """
         cols = list(self.configuration["column_mapping"].keys())
         recommendation_cols = list(
@@ -82,35 +228,20 @@ class Resource:
             self.configuration["account_name_column_mapping"].keys())
         recommendation_grouping = list(
             self.configuration["recommendation_grouping"]["groupby"])
-        # This line flattens out the recommendation object.
-        df = pd.json_normalize(
-            self.raw_data,
-            record_path="recommendations",
-            meta=cols,
-            record_prefix="recommendations_",
-            sep="_"
-        )
-        # Rds resources have two recommendation objects
-        # So we must normalize both of the resources
         if self.name == "rds":
             storage_cols = list(
                 self.configuration["storageRecommendation_mapping"].keys())
-            df2 = pd.json_normalize(
-                self.raw_data,
-                record_path="storageRecommendations",
-                meta=cols,
-                record_prefix="storagerecommendations_",
-                sep="_"
-            )
-            df = df.merge(df2, how="outer", on=cols)
-            df = df.fillna({"storagerecommendations_action": "No Action"})
             recommendation_cols = (recommendation_cols + storage_cols)
 
-        # Apply account id filtering.
-        df = self.filter_account_ids(df)
+        if self.product_data is None:
+            df = normalize_recommendations(self.name, self.raw_data)
+            # Apply account id filtering.
+            df = self.filter_account_ids(df)
+        else:
+            df = self.product_data.select(self.account_ids)
         # Sort
-        df["max"] = df.groupby(recommendation_grouping[0])[
-            recommendation_grouping[1]].transform('max')
+        df = df.assign(max=df.groupby(recommendation_grouping[0])[
+            recommendation_grouping[1]].transform('max'))
         df = df.sort_values(["max", recommendation_grouping[1]],
                             ascending=False).drop('max', axis=1)
         # Add account names to DF
@@ -142,10 +273,13 @@ class Resource:
         """
         if df.empty:
             return df
-        cols = list(self.configuration["account_name_mapping"].keys())
-        df2 = pd.json_normalize(self.account_details, meta=cols, sep="_")
-        df = df.merge(df2[cols], on="vendorAccountId")
-        return df
+        account_names = df["vendorAccountId"].map(self.account_directory)
+        # Recommendations of unknown accounts are dropped, like an inner join
+        df = df.assign(vendorAccountName=account_names.astype(object))
+        df = df[account_names.notna()]
+        # Keep the rows of an account together, ordered by first appearance
+        account_codes, _ = pd.factorize(df["vendorAccountId"])
+        return df.iloc[account_codes.argsort(kind="stable")].reset_index(drop=True)
 
     def filter_account_ids(self, df) -> pd.DataFrame:
         """Filter data based on the account ids passed on instantiation"""
@@ -160,14 +294,14 @@ class Resource:
         affected_ids = pd.concat([
             terminate["vendorAccountId"], rightsize["vendorAccountId"]
         ], ignore_index=True)
-        account_names = pd.DataFrame.from_records(
-            self.account_details,
-            columns=["vendorAccountName", "vendorAccountId"])
-
         # Filter the account names based on the actual recommendations
-        return account_names[
-            account_names["vendorAccountId"].isin(affected_ids)
+        account_names = self.account_directory[
+            self.account_directory.index.isin(affected_ids)
         ]
+        return pd.DataFrame({
+            "vendorAccountName": account_names.astype(object).values,
+            "vendorAccountId": account_names.index.values
+        })
 
     def get_best_recommendation(self, df: pd.DataFrame) -> pd.DataFrame:
         """
@@ -176,18 +310,17 @@ class Resource:
         self.configuration attribute
         """
         grouping_meta = self.configuration["recommendation_grouping"]
-        frames = []
-        # Hacky way to get the best recommendations and preserve all the column
-        # values without grouping
-        for account in df["vendorAccountId"].unique():
-            row_frame = df.loc[df["vendorAccountId"] == account].sort_values(
-                # Sorting by vendorAccountId gives us fake grouping
-                by=grouping_meta["groupby"],
-                ascending=False
-            ).head(1)[grouping_meta["selection"]]
-            frames.append(row_frame)
-
-        return pd.concat(frames)
+        # A single sort puts the best recommendation of every account in
+        # front of its other recommendations, so dropping the duplicated
+        # account ids keeps exactly the best row per account
+        best_df = df.sort_values(
+            by=grouping_meta["groupby"],
+            ascending=False
+        ).drop_duplicates(subset="vendorAccountId")
+        # Return the accounts in the order they appear in the dataframe
+        order = pd.Index(best_df["vendorAccountId"]).get_indexer(
+            df["vendorAccountId"].unique())
+        return best_df.iloc[order][grouping_meta["selection"]]
 
     def count_recommendations(self, df) -> pd.DataFrame:
         """
@@ -217,11 +350,16 @@ class Resource:
         Create the summary for the action (Rightsize or Terminate).
         This includes a recommendation count for each account id as well as
         a summarized message.
+        The summary is computed once per action and cached until the
+        dataframe of the resource is replaced. It must not be modified.
         """
-        df = self.df.loc[self.df["recommendations_action"]
-                         == action.capitalize()]
-        if df.empty:
-            return df
-        count_df = self.count_recommendations(df)
-        best_df = self.get_best_recommendation(df)
-        return self.build_recommendation(count_df=count_df, best_df=best_df)
+        action = action.lower()
+        if action not in self._recommendation_summaries:
+            df = self.df.loc[self.df["recommendations_action"]
+                             == action.capitalize()]
+            if not df.empty:
+                count_df = self.count_recommendations(df)
+                best_df = self.get_best_recommendation(df)
+                df = self.build_recommendation(count_df=count_df, best_df=best_df)
+            self._recommendation_summaries[action] = df
+        return self._recommendation_summaries[action]
@@ -3,21 +3,280 @@
 :copyright: 2022 Liquid Reply GmbH
 """
 
+import gzip
+import hashlib
 import json
+import os
+import re
+import pandas as pd
+
+# zstandard is optional and only needed for zstd compressed archives
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Compression of the raw API archives: gzip, zstd or none
+ARCHIVE_COMPRESSION = os.environ.get("ARCHIVE_COMPRESSION") or "gzip"
+ARCHIVE_EXTENSIONS = {
+    "gzip": ".json.gz",
+    "zstd": ".json.zst",
+    "none": ".json",
+}
+GZIP_LEVEL = 6
+# Records per batch when streaming local json files
+OFFLINE_BATCH_SIZE = 1000
+READ_CHUNK_SIZE = 64 * 1024
+WHITESPACE = re.compile(r"\s*")
+# Characters that can continue a number
+NUMBER_CHARS = set("0123456789.eE+-")
+
+
+def open_json(filepath, mode="r"):
+    """
+    Open a json file as text for reading ("r") or writing ("w").
+    Files ending with .gz are gzip and files ending with .zst are zstd
+    compressed.
+    """
+    if filepath.endswith(".gz"):
+        return gzip.open(filepath, f"{mode}t", encoding="utf-8", compresslevel=GZIP_LEVEL)
+    if filepath.endswith(".zst"):
+        if zstandard is None:
+            raise ImportError(f"The zstandard package is needed to open {filepath}")
+        return zstandard.open(filepath, f"{mode}t", encoding="utf-8")
+    return open(filepath, mode, encoding="utf-8")
+
+
+def archive_extension(compression=ARCHIVE_COMPRESSION) -> str:
+    if compression not in ARCHIVE_EXTENSIONS:
+        raise ValueError(
+            f"Unknown archive compression {compression}, expected one of {list(ARCHIVE_EXTENSIONS)}")
+    return ARCHIVE_EXTENSIONS[compression]
+
+
+def archive_file_extension(filepath) -> str:
+    """Extension of an archive file, e.g. .json.gz"""
+    for extension in ARCHIVE_EXTENSIONS.values():
+        if filepath.endswith(extension):
+            return extension
+    raise ValueError(f"{filepath} is not a json archive")
+
+
+def find_archive(directory, name) -> str:
+    """
+    Path of the archive of an API response in the directory, with any of
+    the supported compressions. The directory is either a raw archive
+    folder or the folder of a day with an index.json, see find_indexed_archive.
+    """
+    for extension in ARCHIVE_EXTENSIONS.values():
+        filepath = f"{directory}/{name}_api{extension}"
+        if os.path.exists(filepath):
+            return filepath
+    if os.path.exists(f"{directory}/index.json"):
+        return find_indexed_archive(directory, name)
+    raise FileNotFoundError(f"No archive of {name} in {directory}")
+
+
+def find_indexed_archive(directory, name) -> str:
+    """
+    Path of the content object of an archive listed in the index.json of
+    the folder of a day. The content keys are relative to the root of the
+    bucket, so they are looked up in the parent folders, e.g. in
+    <bucket>/content for <bucket>/2022/01/22.
+    """
+    with open(f"{directory}/index.json") as file:
+        files = json.load(file)["files"]
+    for extension in ARCHIVE_EXTENSIONS.values():
+        key = files.get(f"raw_api/{name}_api{extension}")
+        if key is None:
+            continue
+        parent = os.path.abspath(directory)
+        while True:
+            filepath = os.path.join(parent, key)
+            if os.path.exists(filepath):
+                return filepath
+            if os.path.dirname(parent) == parent:
+                raise FileNotFoundError(
+                    f"{key} of {name} listed in {directory}/index.json does not exist")
+            parent = os.path.dirname(parent)
+    raise FileNotFoundError(f"No archive of {name} in {directory}/index.json")
+
+
+def write_json(filepath, data) -> str:
+    """
+    Write data as json, compressed depending on the file extension.
+    The document is encoded while writing instead of building one string.
+    """
+    with open_json(filepath, "w") as file:
+        json.dump(data, file)
+    return filepath
 
 
 def use_offline_data(filepath):
     """
     Function used to read local json files. Mainly use is for local debugging
     """
-    with open(filepath, "r") as file:
-        resp = file.read()
-    return json.loads(resp)
-    
-def write_file(filepath, data) -> str:
+    with open_json(filepath) as file:
+        return json.load(file)
+
+
+class JsonStream:
+    """
+    Decodes the values of a json document one by one while reading the
+    file in chunks. Only the chunks of the current value are held in memory.
+    """
+    def __init__(self, file, chunk_size=READ_CHUNK_SIZE) -> None:
+        self.file = file
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        """Read the next chunk. Returns False at the end of the file."""
+        if self.eof:
+            return False
+        chunk = self.file.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        # Drop the part of the buffer that was already decoded
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Next character that is not whitespace, empty at the end of the file"""
+        while True:
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} at position {self.pos} of the json document")
+        self.pos += 1
+
+    def decode(self):
+        """Decode the next complete value"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # A number at the end of the buffer may continue in the next chunk
+                if self.eof or (end < len(self.buffer) and self.buffer[end] not in NUMBER_CHARS):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill()
+
+
+def iter_json_array(filepath, key="result", batch_size=OFFLINE_BATCH_SIZE,
+                    chunk_size=READ_CHUNK_SIZE):
+    """
+    Stream the records of the array stored under key in the json object of
+    the file, e.g. the "result" of an API response. Other values of the
+    object are skipped. Gzip compressed files are supported.
+    Yields lists of at most batch_size records.
+    """
+    with open_json(filepath) as file:
+        stream = JsonStream(file, chunk_size)
+        stream.expect("{")
+        while stream.peek() not in ["}", ""]:
+            name = stream.decode()
+            stream.expect(":")
+            if name != key:
+                stream.decode()
+            else:
+                stream.expect("[")
+                batch = []
+                first = True
+                while stream.peek() != "]":
+                    if not first:
+                        stream.expect(",")
+                    first = False
+                    batch.append(stream.decode())
+                    if len(batch) == batch_size:
+                        yield batch
+                        batch = []
+                stream.pos += 1
+                if len(batch) > 0:
+                    yield batch
+                return
+            if stream.peek() == ",":
+                stream.pos += 1
+        raise KeyError(f"{filepath} has no {key} array")
+
+
+class JsonArchive:
+    """
+    Writes records incrementally as a JSON document of the same shape as
+    the API response: {"result": [record, ...]}
+    The file is compressed depending on its extension, see open_json.
+    """
+    def __init__(self, filepath) -> None:
+        self.filepath = filepath
+        self.file = open_json(filepath, "w")
+        self.file.write('{"result": [')
+        self.count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, records: list):
+        for record in records:
+            if self.count > 0:
+                self.file.write(", ")
+            json.dump(record, self.file)
+            self.count += 1
+
+    def close(self):
+        if not self.file.closed:
+            self.file.write("]}")
+            self.file.close()
+
+
+def archive_batches(batches, filepath):
+    """
+    Pass the record batches through while writing them to a JSON archive.
+    The archive is complete once all batches are consumed.
+    """
+    with JsonArchive(filepath) as archive:
+        for batch in batches:
+            archive.write(batch)
+            yield batch
+
+
+def content_hash(frames: list, labels: list = ()) -> str:
+    """
+    Hash of the values and column names of the dataframes and the labels.
+    Dataframes with the same content have the same hash, independent of
+    their index and of when they were created.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([str(label) for label in labels]).encode())
+    for df in frames:
+        digest.update(json.dumps([str(column) for column in df.columns]).encode())
+        digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return digest.hexdigest()
+
+
+def file_content_hash(filepath, chunk_size=READ_CHUNK_SIZE) -> str:
     """
-    Write data to filesystem.
+    Hash of the json document in the file. Compressed files are hashed
+    after decompression, so the hash does not depend on the compression
+    or the timestamp in the gzip header.
     """
-    with open(filepath, "w") as file:
-        file.write(data)
-    return filepath
\ No newline at end of file
+    digest = hashlib.sha256()
+    with open_json(filepath) as file:
+        for chunk in iter(lambda: file.read(chunk_size), ""):
+            digest.update(chunk.encode())
+    return digest.hexdigest()
@@ -0,0 +1,82 @@
+"""
+Module to test the loading of the account to project mapping
+
+:license: AGPL v3, see LICENSE for more details
+:copyright: 2022 Liquid Reply GmbH
+"""
+
+import sqlite3
+from unittest import mock
+
+import pandas as pd
+import finops_report_automation.account_mapping as account_mapping
+
+MAPPING_ROWS = [
+    ["project1", "000000000001"],
+    ["project2", "000000000002"],
+    ["project1", "000000000003"],
+]
+
+
+def assert_mapping(mapping):
+    assert(mapping.project_accounts == {
+        "project1": ["000000000001", "000000000003"],
+        "project2": ["000000000002"],
+    })
+    assert(mapping.account_projects["000000000002"] == "project2")
+    assert(len(mapping) == 3)
+
+
+def test_csv_mapping(tmp_path):
+    path = tmp_path / "accountMapping.csv"
+    pd.DataFrame(MAPPING_ROWS, columns=["project", "account"]).to_csv(path, index=False)
+    with mock.patch.object(account_mapping, "CACHE_PATH", str(tmp_path / "cache")):
+        assert_mapping(account_mapping.load_account_mapping(str(path)))
+
+
+def test_sqlite_mapping(tmp_path):
+    path = tmp_path / "accountMapping.db"
+    with sqlite3.connect(path) as connection:
+        connection.execute("CREATE TABLE accountMapping (projectName TEXT, vendorAccountId TEXT)")
+        connection.executemany("INSERT INTO accountMapping VALUES (?, ?)", MAPPING_ROWS)
+    assert_mapping(account_mapping.load_account_mapping(str(path)))
+
+
+def test_excel_mapping_cache(tmp_path):
+    """
+    The excel file is only parsed once, later loads use the cached form
+    """
+    path = tmp_path / "accountMapping.xlsx"
+    rows = [["Mapping", None], ["projectName", "vendorAccountId"]] + MAPPING_ROWS
+    pd.DataFrame(rows).to_excel(path, index=False, header=False)
+    with mock.patch.object(account_mapping, "CACHE_PATH", str(tmp_path / "cache")):
+        assert_mapping(account_mapping.load_account_mapping(str(path)))
+
+        account_mapping._loaded_mappings.clear()
+        with mock.patch.object(account_mapping, "read_account_mapping") as read:
+            assert_mapping(account_mapping.load_account_mapping(str(path)))
+            read.assert_not_called()
+
+
+def test_incompatible_mapping_cache(tmp_path):
+    """
+    A cache that can't be loaded, e.g. written by another version, is parsed
+    again and replaced
+    """
+    path = tmp_path / "accountMapping.xlsx"
+    rows = [["Mapping", None], ["projectName", "vendorAccountId"]] + MAPPING_ROWS
+    pd.DataFrame(rows).to_excel(path, index=False, header=False)
+    cache_dir = tmp_path / "cache" / "account_mapping"
+    cache_dir.mkdir(parents=True)
+    cache_file = cache_dir / f"{account_mapping.mapping_cache_key(str(path))}.pickle"
+    # unpickling a class that no longer exists raises an AttributeError
+    cache_file.write_bytes(b"cfinops_report_automation.account_mapping\nMissing\n.")
+    with mock.patch.object(account_mapping, "CACHE_PATH", str(tmp_path / "cache")):
+        account_mapping._loaded_mappings.clear()
+        assert_mapping(account_mapping.load_account_mapping(str(path)))
+
+        account_mapping._loaded_mappings.clear()
+        with mock.patch.object(account_mapping, "read_account_mapping") as read:
+            assert_mapping(account_mapping.load_account_mapping(str(path)))
+            read.assert_not_called()
+    assert([file.name for file in cache_dir.iterdir()] == [cache_file.name])
@@ -5,18 +5,224 @@ Module to test all related api functions
 :copyright: 2022 Liquid Reply GmbH
 """
 
+import gzip
+import json
+import tempfile
+import threading
+import time
 import unittest
 import os
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
 
+from concurrent.futures import ThreadPoolExecutor
 from unittest import mock
-from finops_report_automation.api import Api
+from finops_report_automation.api import Api, fetch_all
+from finops_report_automation.cache import ResponseCache
+from finops_report_automation.errors import ApiError
 
 
+class StandInHandler(BaseHTTPRequestHandler):
+  """
+  Stand-in for the Cloudability API. /flaky fails with a 503 twice before
+  it answers, every path counts its requests. The recommendations of ec2
+  are paged with limit and offset, the ones of capped with at most 2
+  records per page. ignored ignores the offset and counted returns the
+  total count.
+  """
+  requests = {}
+  recommendations = [{"id": i} for i in range(5)]
+
+  def do_GET(self):
+      path = self.path.split("?")[0]
+      query = parse_qs(urlparse(self.path).query)
+      count = self.requests.get(path, 0) + 1
+      self.requests[path] = count
+      if path.startswith("/v3/rightsizing/aws/recommendations/"):
+          product = path.rsplit("/", 1)[1]
+          offset = int(query["offset"][0])
+          limit = int(query["limit"][0])
+          if product == "capped":
+              limit = min(limit, 2)
+          elif product == "ignored":
+              offset = 0
+          body = {"result": self.recommendations[offset:offset + limit]}
+          if product == "counted":
+              body["meta"] = {"totalCount": len(self.recommendations)}
+          self.respond(200, json.dumps(body))
+      elif path == "/etag" and self.headers.get("If-None-Match") == '"v1"':
+          self.respond(304, "")
+      elif path == "/etag":
+          self.respond(200, json.dumps({"result": "etag"}), {"ETag": '"v1"'})
+      elif path == "/ok":
+          self.respond(200, json.dumps({"result": [1, 2]}))
+      elif path == "/flaky" and count <= 2:
+          self.respond(503, "", {"Retry-After": "0"})
+      elif path == "/flaky":
+          self.respond(200, json.dumps({"result": count}))
+      elif path == "/html":
+          self.respond(200, "<html></html>")
+      else:
+          self.respond(404, "")
+
+  def respond(self, status, body, headers={}):
+      self.send_response(status)
+      for name, value in headers.items():
+          self.send_header(name, value)
+      self.send_header("Content-Length", str(len(body)))
+      self.end_headers()
+      self.wfile.write(body.encode())
+
+  def log_message(self, *args):
+      pass
+
+
+class Python38Executor(ThreadPoolExecutor):
+  """ThreadPoolExecutor with the shutdown signature of Python 3.8"""
+  def shutdown(self, wait=True):
+      super().shutdown(wait=wait)
+
+
+@mock.patch.dict(os.environ, {"API_KEY": "123KEY"})
 class TestApi(unittest.TestCase):
 
+  @classmethod
+  def setUpClass(cls):
+      cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+      cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+      cls.thread.start()
+      cls.base_url = f"http://127.0.0.1:{cls.server.server_port}"
+
+  @classmethod
+  def tearDownClass(cls):
+      cls.server.shutdown()
+      cls.server.server_close()
+
+  def setUp(self):
+      StandInHandler.requests.clear()
+      self.api = Api(self.base_url, retries=3, backoff_factor=0)
+
+  def tearDown(self):
+      self.api.close()
+
   # This mocks an API_KEY to ensure that our getter function
   # is correctly retrieving the key
-  @mock.patch.dict(os.environ, {"API_KEY": "123KEY"})
   def test_wrong_request(self):
-      api = Api("http://badUrl.com")
-      self.assertTrue({} == api.request("/badPath"))
+      api = Api("http://127.0.0.1:1", retries=0)
+      with self.assertRaises(ApiError):
+          api.request("/badPath")
+
+  def test_request(self):
+      self.assertEqual({"result": [1, 2]}, self.api.request("/ok"))
+      self.assertEqual({"result": [1, 2]}, self.api.request("/ok"))
+
+  def test_retry(self):
+      self.assertEqual({"result": 3}, self.api.request("/flaky"))
+      self.assertEqual(3, StandInHandler.requests["/flaky"])
+
+  def test_failed_request(self):
+      with self.assertRaises(ApiError) as context:
+          self.api.request("/missing")
+      self.assertEqual(404, context.exception.status_code)
+      with self.assertRaises(ApiError):
+          self.api.request("/html")
+
+  def test_fetch_all(self):
+      calls = {
+          "slow": lambda: time.sleep(0.2) or "slow",
+          "fast": lambda: "fast",
+          "ok": lambda: self.api.request("/ok"),
+      }
+      results = list(fetch_all(calls, workers=3))
+      self.assertEqual("slow", results[-1][0])
+      self.assertEqual(
+          {"slow": "slow", "fast": "fast", "ok": {"result": [1, 2]}}, dict(results))
+
+      with self.assertRaises(ApiError):
+          list(fetch_all({"missing": lambda: self.api.request("/missing")}))
+
+  @mock.patch("finops_report_automation.api.ThreadPoolExecutor", Python38Executor)
+  def test_fetch_all_python38(self):
+      started = []
+      def call(key):
+          started.append(key)
+          time.sleep(0.1)
+          return key
+      calls = {key: (lambda key=key: call(key)) for key in range(4)}
+      self.assertEqual(4, len(list(fetch_all(calls, workers=2))))
+
+      # Calls that did not start yet are cancelled after a failure
+      started.clear()
+      calls = {"missing": lambda: self.api.request("/missing"), **calls}
+      with self.assertRaises(ApiError):
+          list(fetch_all(calls, workers=1))
+      self.assertLess(len(started), 4)
+
+  def test_iter_rightsizing(self):
+      path = "/v3/rightsizing/aws/recommendations/ec2"
+      batches = list(self.api.iter_rightsizing({"product": "ec2"}, page_size=2))
+      self.assertEqual([2, 2, 1], [len(batch) for batch in batches])
+      self.assertEqual(StandInHandler.recommendations, [r for batch in batches for r in batch])
+      # The last page is empty
+      self.assertEqual(4, StandInHandler.requests[path])
+
+      # The limit and offset of the config are used for paging
+      batches = list(self.api.iter_rightsizing({"product": "ec2", "limit": 3, "offset": 1}))
+      self.assertEqual([3, 1], [len(batch) for batch in batches])
+      self.assertEqual(StandInHandler.recommendations[1:], [r for batch in batches for r in batch])
+
+  def test_iter_rightsizing_server_limits(self):
+      # Short pages of an API that caps the limit are not the last ones
+      batches = list(self.api.iter_rightsizing({"product": "capped"}, page_size=1000))
+      self.assertEqual([2, 2, 1], [len(batch) for batch in batches])
+      self.assertEqual(StandInHandler.recommendations, [r for batch in batches for r in batch])
+
+      # An API that ignores the offset does not page forever
+      batches = list(self.api.iter_rightsizing({"product": "ignored"}, page_size=2))
+      self.assertEqual([StandInHandler.recommendations[:2]], batches)
+      self.assertEqual(2, StandInHandler.requests["/v3/rightsizing/aws/recommendations/ignored"])
+
+      # No empty page is requested once the total count is reached
+      batches = list(self.api.iter_rightsizing({"product": "counted"}, page_size=5))
+      self.assertEqual([5], [len(batch) for batch in batches])
+      self.assertEqual(1, StandInHandler.requests["/v3/rightsizing/aws/recommendations/counted"])
+
+  def test_cache(self):
+      with tempfile.TemporaryDirectory() as cache_dir:
+          cache = ResponseCache(cache_dir, ttls={"/ok": 3600, "/etag": 0})
+          api = Api(self.base_url, retries=0, cache=cache)
+
+          # Fresh responses are not requested again
+          self.assertEqual({"result": [1, 2]}, api.request("/ok", {"b": 1, "a": 2}))
+          self.assertEqual({"result": [1, 2]}, api.request("/ok", {"a": 2, "b": 1}))
+          self.assertEqual(1, StandInHandler.requests["/ok"])
+          key = cache.key(f"{self.base_url}/ok", {"a": 2, "b": 1}, "123KEY")
+          with gzip.open(cache.filepath(key)) as file:
+              self.assertEqual({"result": [1, 2]}, json.load(file)["body"])
+
+          # Responses of another API key are not shared
+          with mock.patch.dict(os.environ, {"API_KEY": "456KEY"}):
+              other_api = Api(self.base_url, retries=0, cache=cache)
+              self.assertEqual({"result": [1, 2]}, other_api.request("/ok", {"a": 2, "b": 1}))
+              other_api.close()
+          self.assertEqual(2, StandInHandler.requests["/ok"])
+
+          # Stale responses are revalidated with their ETag
+          self.assertEqual({"result": "etag"}, api.request("/etag"))
+          self.assertEqual({"result": "etag"}, api.request("/etag"))
+          self.assertEqual(2, StandInHandler.requests["/etag"])
+          api.close()
+
+  def test_cache_eviction(self):
+      with tempfile.TemporaryDirectory() as cache_dir:
+          cache = ResponseCache(cache_dir, ttls={"/ok": 3600}, grace=60)
+          cache.store("expired", {"result": []})
+          cache.store("recent", {"result": []})
+          expired = time.time() - 3600 - 61
+          os.utime(cache.filepath("expired"), (expired, expired))
+
+          # Entries older than the largest TTL and the grace are removed
+          # when the cache is opened
+          cache = ResponseCache(cache_dir, ttls={"/ok": 3600}, grace=60)
+          self.assertIsNone(cache.load("expired"))
+          self.assertEqual({"result": []}, cache.load("recent")["body"])
@@ -0,0 +1,122 @@
+"""
+:license: AGPL v3, see LICENSE for more details
+:copyright: 2022 Liquid Reply GmbH
+"""
+
+import io
+import json
+import threading
+import pytest
+from botocore.exceptions import ClientError
+from finops_report_automation.aws import UploadManager, download_raw_archive
+from finops_report_automation.errors import UploadError
+
+
+class FakeS3Client:
+    """
+    Stand-in for the boto3 S3 client that keeps the uploaded objects in
+    memory. Uploads to keys starting with "denied/" fail like S3 would.
+    """
+    def __init__(self):
+        self.objects = {}
+        self.threads = set()
+
+    def upload_file(self, Filename, Bucket, Key, Config=None):
+        self.threads.add(threading.get_ident())
+        if Key.startswith("denied/"):
+            raise ClientError(
+                {"Error": {"Code": "AccessDenied", "Message": "Access Denied"}}, "PutObject")
+        with open(Filename, "rb") as file:
+            self.objects[(Bucket, Key)] = file.read()
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, Config=None):
+        self.objects[(Bucket, Key)] = Fileobj.read()
+
+    def head_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise ClientError({"Error": {"Code": "404", "Message": "Not Found"}}, "HeadObject")
+
+    def put_object(self, Bucket, Key, Body, ContentType=None):
+        self.objects[(Bucket, Key)] = Body
+
+    def get_object(self, Bucket, Key):
+        return {"Body": io.BytesIO(self.objects[(Bucket, Key)])}
+
+    def download_file(self, Bucket, Key, Filename):
+        with open(Filename, "wb") as file:
+            file.write(self.objects[(Bucket, Key)])
+
+
+def test_upload_manager(tmp_path):
+    """
+    All files are uploaded and failures are reported per file
+    """
+    s3_client = FakeS3Client()
+    files = []
+    for i in range(10):
+        filepath = tmp_path / f"report_{i}.xlsx"
+        filepath.write_bytes(f"report {i}".encode())
+        files.append(str(filepath))
+
+    with UploadManager(s3_client, "bucket", workers=4) as uploads:
+        for i, filepath in enumerate(files):
+            uploads.upload(filepath, f"2022/05/12/report_{i}.xlsx")
+        uploads.upload(str(tmp_path / "missing.xlsx"), "2022/05/12/missing.xlsx")
+        uploads.upload(files[0], "denied/report_0.xlsx")
+        uploads.upload(io.BytesIO(b"in memory"), "2022/05/12/memory.xlsx")
+
+    results = uploads.results
+    assert([result.ok for result in results] == [True] * 10 + [False, False, True])
+    assert(isinstance(results[10].error, FileNotFoundError))
+    assert(isinstance(results[11].error, ClientError))
+    assert(s3_client.objects[("bucket", "2022/05/12/report_3.xlsx")] == b"report 3")
+    assert(s3_client.objects[("bucket", "2022/05/12/memory.xlsx")] == b"in memory")
+    assert(len(s3_client.objects) == 11)
+    with pytest.raises(UploadError):
+        uploads.raise_for_failures()
+
+
+def test_upload_content(tmp_path):
+    """
+    Content objects that already exist are not uploaded again, the index
+    only lists the files that were uploaded
+    """
+    s3_client = FakeS3Client()
+    filepath = tmp_path / "project.xlsx"
+    filepath.write_bytes(b"report")
+    s3_client.objects[("bucket", "content/unchanged.xlsx")] = b"report"
+
+    with UploadManager(s3_client, "bucket") as uploads:
+        uploads.upload_content(str(filepath), "Project reports/unchanged.xlsx", "unchanged", ".xlsx")
+        uploads.upload_content(str(filepath), "Project reports/changed.xlsx", "changed", ".xlsx")
+        uploads.upload_content(str(tmp_path / "missing.xlsx"), "missing.xlsx", "missing", ".xlsx")
+    assert([result.skipped for result in uploads.results] == [True, False, False])
+    assert(s3_client.objects[("bucket", "content/changed.xlsx")] == b"report")
+
+    assert(uploads.write_index("2022/05/12/index.json", date="2022-05-12").ok)
+    index = json.loads(s3_client.objects[("bucket", "2022/05/12/index.json")])
+    assert(index == {
+        "date": "2022-05-12",
+        "files": {
+            "Project reports/unchanged.xlsx": "content/unchanged.xlsx",
+            "Project reports/changed.xlsx": "content/changed.xlsx",
+        },
+    })
+
+
+def test_download_raw_archive(tmp_path):
+    """
+    The raw archive of a day is rebuilt from the content objects of its index
+    """
+    s3_client = FakeS3Client()
+    with UploadManager(s3_client, "bucket") as uploads:
+        uploads.upload_content(io.BytesIO(b"accounts"), "raw_api/accounts_api.json.gz",
+                               "abc", ".json.gz")
+        uploads.upload_content(io.BytesIO(b"report"), "Project reports/project.xlsx",
+                               "def", ".xlsx")
+    uploads.write_index("2022/05/12/index.json", date="2022-05-12")
+
+    folder = download_raw_archive(s3_client, "bucket", "2022/05/12", str(tmp_path / "replay"))
+    assert(sorted(path.name for path in (tmp_path / "replay").iterdir()) == ["accounts_api.json.gz"])
+    assert((tmp_path / "replay" / "accounts_api.json.gz").read_bytes() == b"accounts")
+    assert(folder == str(tmp_path / "replay"))
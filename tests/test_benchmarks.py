@@ -0,0 +1,55 @@
+"""
+:license: AGPL v3, see LICENSE for more details
+:copyright: 2022 Liquid Reply GmbH
+"""
+
+import json
+import pytest
+from benchmarks.generator import PRODUCTS, generate_scenario
+from benchmarks.run import parse_size, run_benchmarks
+
+
+def test_generate_scenario():
+    """
+    The same seed generates the same scenario, every project has accounts
+    and all records belong to known accounts
+    """
+    scenario = generate_scenario(accounts=12, projects=4, records=50, seed=3)
+    assert(generate_scenario(accounts=12, projects=4, records=50, seed=3).products == scenario.products)
+    assert(generate_scenario(accounts=12, projects=4, records=50, seed=4).products != scenario.products)
+
+    account_ids = {account["vendorAccountId"] for account in scenario.accounts}
+    assert(len(account_ids) == 12)
+    assert(set(scenario.mapping.df["vendorAccountId"]) == account_ids)
+    assert(len(scenario.mapping.project_accounts) == 4)
+    assert(len(scenario.amortized_cost["rows"]) == 12)
+    assert(list(scenario.products) == PRODUCTS)
+    for records in scenario.products.values():
+        assert(len(records) == 50)
+        assert({record["vendorAccountId"] for record in records} <= account_ids)
+
+    with pytest.raises(ValueError):
+        generate_scenario(accounts=2, projects=3, records=10)
+
+
+def test_run_benchmarks():
+    """
+    All stages are timed for every size and the results can be written
+    as json
+    """
+    assert(parse_size("small") == ("small", 50, 5, 1000))
+    with pytest.raises(ValueError):
+        parse_size("huge")
+
+    results = run_benchmarks([parse_size("6:2:20")], repeat=2, backends=["streaming"])
+    result = results["results"][0]
+    assert(result["accounts"] == 6 and result["records"] == 20)
+    assert(list(result["stages"]) == [
+        "normalize", "create_projects", "resources", "create_summary",
+        "write_reports_streaming", "cross_project_streaming",
+    ])
+    for stage in result["stages"].values():
+        assert(len(stage["runs"]) == 2)
+        assert(stage["best"] == min(stage["runs"]))
+    assert(result["rows"]["ec2"] >= 20)
+    json.dumps(results)
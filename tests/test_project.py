@@ -7,7 +7,10 @@ import pytest
 import pandas as pd
 import numpy as np
 import json
-from finops_report_automation.project import Project
+import os
+import pickle
+import openpyxl
+from finops_report_automation.project import Project, write_project_report, write_reports
 from finops_report_automation.resource import Resource
 
 TEST_DATA_DIR="tests/test_data"
@@ -78,3 +81,175 @@ def test_project(make_project_instance):
     assert(np.array_equal(cross_project_summary.values, mock_cross_project_summary.values))
 
 
+
+def test_lazy_summary(make_project_instance):
+    """
+    The summary is only computed on access and recomputed after new
+    resources are added
+    """
+    project = make_project_instance()
+    assert(project._summary is None)
+    summary_df = project.summary
+    assert(project.summary is summary_df)
+
+    project.add_resource(project.resources[0])
+    assert(project._summary is None)
+    assert(len(project.summary) == 2 * len(summary_df))
+
+
+def read_workbook_values(filename):
+    workbook = openpyxl.load_workbook(filename)
+    return {
+        sheet.title: [[cell.value for cell in row] for row in sheet.iter_rows()]
+        for sheet in workbook
+    }
+
+
+def test_parallel_reports(make_project_instance, tmp_path):
+    """
+    Reports written by the process pool match the serially written ones
+    """
+    serial_dir = tmp_path / "serial"
+    parallel_dir = tmp_path / "parallel"
+    serial_dir.mkdir()
+    parallel_dir.mkdir()
+    projects = [make_project_instance(), make_project_instance()]
+    projects[1].name = "secondProject"
+
+    serial = [result for _, result in write_reports(projects, str(serial_dir), workers=1)]
+    projects = [make_project_instance(), make_project_instance()]
+    projects[1].name = "secondProject"
+    reports = list(write_reports(projects, str(parallel_dir), workers=2))
+    assert([project for project, _ in reports] == projects)
+    parallel = [result for _, result in reports]
+    assert(len(parallel) == 2)
+    assert(parallel[0][1].equals(serial[0][1]))
+    assert(read_workbook_values(parallel[0][0]) == read_workbook_values(serial[0][0]))
+
+
+def test_streaming_report(make_project_instance, tmp_path):
+    """
+    The streaming backend writes the same cells as the openpyxl backend
+    """
+    openpyxl_dir = tmp_path / "openpyxl"
+    streaming_dir = tmp_path / "streaming"
+    openpyxl_dir.mkdir()
+    streaming_dir.mkdir()
+
+    expected = make_project_instance().write_report(str(openpyxl_dir), backend="openpyxl")
+    actual = make_project_instance().write_report(str(streaming_dir), backend="streaming")
+    assert(read_workbook_values(actual) == read_workbook_values(expected))
+
+    with pytest.raises(ValueError):
+        make_project_instance().write_report(str(streaming_dir), backend="xlsxwriter")
+
+
+def test_report_number_formats(make_project_instance, tmp_path):
+    """
+    Currency and percentage values are written as formatted numbers and
+    the summary of the project is not modified
+    """
+    project = make_project_instance()
+    summary = project.summary.copy()
+    filename = project.write_report(str(tmp_path))
+    assert(project.summary.equals(summary))
+
+    worksheet = openpyxl.load_workbook(filename)["General"]
+    # First summary row: monthly savings in column G, relation in column J
+    assert(worksheet["G6"].value == summary["monthlySavings"].iloc[0])
+    assert(worksheet["G6"].number_format == '"$"0.00')
+    assert(worksheet["J6"].number_format == "0.00%")
+
+
+def test_content_hash(make_project_instance):
+    """
+    Reports of the same data have the same content hash, changed data
+    changes it
+    """
+    project = make_project_instance()
+    digest = project.content_hash()
+    assert(make_project_instance().content_hash() == digest)
+
+    changed = make_project_instance()
+    changed.resources[0].df = changed.resources[0].df.iloc[1:]
+    assert(changed.content_hash() != digest)
+    changed = make_project_instance()
+    changed.name = "secondProject"
+    assert(changed.content_hash() != digest)
+
+
+def test_report_output(make_project_instance, tmp_path):
+    """
+    Reports kept in memory have the same content as the written files and
+    are only written to disk with the output "both"
+    """
+    expected = make_project_instance().write_report(str(tmp_path))
+    memory_dir = tmp_path / "memory"
+    both_dir = tmp_path / "both"
+    memory_dir.mkdir()
+    both_dir.mkdir()
+
+    filepath, _, _, buffer = write_project_report(make_project_instance(), str(memory_dir), "memory")
+    assert(filepath == "")
+    assert(list(memory_dir.iterdir()) == [])
+    assert(read_workbook_values(buffer) == read_workbook_values(expected))
+
+    filepath, _, _, buffer = write_project_report(make_project_instance(), str(both_dir), "both")
+    assert(read_workbook_values(filepath) == read_workbook_values(expected))
+    assert(buffer.read() == open(filepath, "rb").read())
+
+    with pytest.raises(ValueError):
+        write_project_report(make_project_instance(), str(memory_dir), "s3")
+
+
+def test_project_pickle(make_project_instance):
+    """
+    Projects sent to the report workers leave out the raw costs and the
+    costs and names of other accounts, but create the same summary
+    """
+    project = make_project_instance()
+    project.amortized_costs = pd.concat([
+        project.amortized_costs, pd.Series([5.0], index=["999999"])])
+    project.resources[0].account_directory = pd.concat([
+        project.resources[0].account_directory,
+        pd.Series(["other"], index=["999999"], dtype="category"),
+    ]).astype("category")
+    clone = pickle.loads(pickle.dumps(project))
+    assert(clone.amortized_costs_raw is None)
+    assert("999999" not in clone.amortized_costs.index)
+    assert("999999" not in clone.resources[0].account_directory.index)
+    assert("other" not in clone.resources[0].account_directory.cat.categories)
+    assert(clone.summary.equals(project.summary))
+    assert(clone.sum.equals(project.sum))
+    assert(clone.resources[0].affected_accounts().equals(project.resources[0].affected_accounts()))
+
+
+def test_reports_are_yielded_when_written(make_project_instance, tmp_path):
+    """
+    The report of a project is returned before the next one is written,
+    so it can be uploaded in the meantime
+    """
+    projects = [make_project_instance(), make_project_instance()]
+    projects[1].name = "secondProject"
+    reports = write_reports(projects, str(tmp_path), workers=1)
+    project, (filepath, summary, digest, buffer) = next(reports)
+    assert(project is projects[0])
+    assert(os.path.exists(filepath))
+    assert(not os.path.exists(tmp_path / "secondProject.xlsx"))
+    assert(len(list(reports)) == 1)
+
+
+def test_parallel_reports_order(make_project_instance, tmp_path):
+    """
+    The process pool yields the reports in the order of the projects,
+    also when more projects than queued reports are written
+    """
+    projects = []
+    for number in range(5):
+        project = make_project_instance()
+        project.name = f"project{number}"
+        projects.append(project)
+    reports = list(write_reports(projects, str(tmp_path), workers=2))
+    assert([project.name for project, _ in reports] == [project.name for project in projects])
+    assert([os.path.basename(result[0]) for _, result in reports]
+           == [f"{project.name}.xlsx" for project in projects])
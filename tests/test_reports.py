@@ -7,7 +7,13 @@ import pytest
 import pandas as pd
 import numpy as np
 import json
-from finops_report_automation.resource import Resource
+from finops_report_automation.resource import ProductData, Resource, create_account_directory
+from finops_report_automation.formatting import (
+    CURRENCY_FORMAT,
+    column_widths,
+    row_style_codes,
+    terminate_cells,
+)
 
 TEST_DATA_DIR="tests/test_data"
 
@@ -119,3 +125,85 @@ def test_ebs(make_resource_instance):
     ebs_df2 = ebs.df.sort_values(by="vendorAccountId")
     mock_df = mock_df.sort_values(by="vendorAccountId")
     assert(np.array_equal(ebs_df2.values, mock_df.values))
+
+
+def test_shared_product_data(make_resource_instance):
+    """
+    Resources created from a shared ProductData should be identical to the
+    ones normalizing the raw data themselves
+    """
+    ec2 = make_resource_instance("ec2")
+    product_data = ProductData("ec2", ec2.raw_data)
+    account_directory = create_account_directory(ec2.account_details)
+    for account_ids in [ec2.account_ids, ["111111"], []]:
+        expected = Resource("ec2", ec2.raw_data, account_ids, ec2.account_details)
+        shared = Resource(
+            "ec2", ec2.raw_data, account_ids, None, product_data, account_directory)
+        assert(expected.df.equals(shared.df))
+        assert(expected.affected_accounts().equals(shared.affected_accounts()))
+
+
+def test_recommendation_summary_cache(make_resource_instance):
+    """
+    Recommendation summaries are computed once and dropped when the
+    dataframe of the resource is replaced
+    """
+    s3 = make_resource_instance("s3")
+    terminate = s3.recommendation_summary(action="terminate")
+    assert(s3.recommendation_summary(action="Terminate") is terminate)
+    s3.affected_accounts()
+    assert(s3.recommendation_summary(action="terminate") is terminate)
+
+    s3.df = s3.df.loc[s3.df["recommendations_action"] == "Rightsize"]
+    assert(s3.recommendation_summary(action="terminate").empty)
+
+
+def test_row_style_codes():
+    """
+    Groups alternate between white and grey, terminate rows are red
+    """
+    df = pd.DataFrame({
+        "name": ["EC2", "EC2", "EBS", "S3", "S3"],
+        "recommendations_action": ["Rightsize", "Terminate", "Rightsize", "Rightsize", "Terminate"],
+        "savings": [1.0, 2.0, 3.0, 4.0, 5.0],
+    })
+    assert(row_style_codes(df, "name").tolist() == [0, 0, 1, 0, 0])
+    assert(row_style_codes(df, "name", highlight_terminate=True).tolist() == [0, 2, 1, 0, 2])
+    assert(terminate_cells(df).tolist() == [
+        [False, False, False],
+        [False, True, False],
+        [False, False, False],
+        [False, False, False],
+        [False, True, False],
+    ])
+
+
+def test_column_widths():
+    """
+    Widths use the longest value of the column, the formatted numbers and
+    are capped
+    """
+    df = pd.DataFrame({
+        "name": ["EC2", "a longer name"],
+        "savings": [5.0, 1234.5],
+        "message": ["x" * 500, "y"],
+    })
+    widths = column_widths(df, ["Name", "Savings", "Message"], [None, CURRENCY_FORMAT, None],
+                           max_width=100)
+    assert(widths == [len("a longer name") + 5, len("$1234.50") + 5, 100])
+    assert(column_widths(df.iloc[:0], ["Resource type"]) == [len("Resource type") / 3 + 5])
+
+
+def test_product_data_from_batches(make_resource_instance):
+    """
+    Normalizing the records page by page gives the same dataframe as
+    normalizing all records at once
+    """
+    for name in ["ec2", "ebs", "s3"]:
+        resource = make_resource_instance(name)
+        expected = ProductData(name, resource.raw_data)
+        batches = [[record] for record in resource.raw_data]
+        product_data = ProductData.from_batches(name, iter(batches))
+        assert(product_data.raw_data is None)
+        pd.testing.assert_frame_equal(product_data.df, expected.df)
+        assert(product_data.partitions.keys() == expected.partitions.keys())
@@ -0,0 +1,109 @@
+"""
+:license: AGPL v3, see LICENSE for more details
+:copyright: 2022 Liquid Reply GmbH
+"""
+
+import gzip
+import json
+import pytest
+from finops_report_automation.utils import (
+    JsonArchive,
+    archive_extension,
+    archive_file_extension,
+    find_archive,
+    iter_json_array,
+    use_offline_data,
+    write_json,
+)
+
+DOCUMENT = {
+    "meta": {"filter": "] [ { } \"result\": ["},
+    "result": [{"id": i, "savings": 12.5 * i, "name": "a\"]}"} for i in range(10)] + [2.5e10, None],
+    "total": 12,
+}
+
+
+@pytest.mark.parametrize("filename", ["data.json", "data.json.gz"])
+def test_iter_json_array(tmp_path, filename):
+    """
+    Records are streamed in batches from plain and gzip compressed files,
+    also if values are split between chunks
+    """
+    filepath = str(tmp_path / filename)
+    opener = gzip.open if filename.endswith(".gz") else open
+    with opener(filepath, "wt") as file:
+        json.dump(DOCUMENT, file, indent=2)
+
+    for chunk_size in [1, 5, 4096]:
+        batches = list(iter_json_array(filepath, batch_size=4, chunk_size=chunk_size))
+        assert([len(batch) for batch in batches] == [4, 4, 4])
+        assert([record for batch in batches for record in batch] == DOCUMENT["result"])
+    assert(use_offline_data(filepath) == DOCUMENT)
+
+
+def test_iter_json_array_errors(tmp_path):
+    filepath = str(tmp_path / "truncated.json")
+    with open(filepath, "w") as file:
+        file.write('{"result": [{"id": 1}, {"id"')
+    with pytest.raises(ValueError):
+        list(iter_json_array(filepath, chunk_size=8))
+
+    with open(filepath, "w") as file:
+        json.dump({"rows": []}, file)
+    with pytest.raises(KeyError):
+        list(iter_json_array(filepath))
+
+
+def test_json_archive(tmp_path):
+    filepath = str(tmp_path / "archive.json")
+    with JsonArchive(filepath) as archive:
+        archive.write(DOCUMENT["result"][:3])
+        archive.write([])
+        archive.write(DOCUMENT["result"][3:])
+    assert(use_offline_data(filepath) == {"result": DOCUMENT["result"]})
+
+
+@pytest.mark.parametrize("compression", ["gzip", "zstd", "none"])
+def test_compressed_archives(tmp_path, compression):
+    """
+    Archives are real json documents that can be replayed, compressed
+    depending on their extension
+    """
+    if compression == "zstd":
+        pytest.importorskip("zstandard")
+    extension = archive_extension(compression)
+    write_json(str(tmp_path / f"accounts_api{extension}"), {"result": [{"id": "1"}]})
+    with JsonArchive(str(tmp_path / f"ec2_api{extension}")) as archive:
+        archive.write(DOCUMENT["result"])
+
+    assert(use_offline_data(find_archive(str(tmp_path), "accounts")) == {"result": [{"id": "1"}]})
+    assert(archive_file_extension(find_archive(str(tmp_path), "accounts")) == extension)
+    batches = list(iter_json_array(find_archive(str(tmp_path), "ec2")))
+    assert([record for batch in batches for record in batch] == DOCUMENT["result"])
+    if compression == "gzip":
+        with gzip.open(tmp_path / "accounts_api.json.gz", "rt") as file:
+            assert(json.load(file) == {"result": [{"id": "1"}]})
+    with pytest.raises(FileNotFoundError):
+        find_archive(str(tmp_path), "rds")
+
+
+def test_indexed_archive(tmp_path):
+    """
+    The folder of a day in a copy of the bucket is replayed through its
+    index, the archives are the content objects at the root of the bucket
+    """
+    day = tmp_path / "2022" / "01" / "22"
+    day.mkdir(parents=True)
+    (tmp_path / "content").mkdir()
+    write_json(str(tmp_path / "content" / "abc.json.gz"), {"result": [{"id": "1"}]})
+    (day / "index.json").write_text(json.dumps({"date": "2022-01-22", "files": {
+        "raw_api/accounts_api.json.gz": "content/abc.json.gz",
+        "raw_api/ec2_api.json.gz": "content/missing.json.gz",
+        "cross_project_overview.xlsx": "content/def.xlsx",
+    }}))
+
+    assert(use_offline_data(find_archive(str(day), "accounts")) == {"result": [{"id": "1"}]})
+    with pytest.raises(FileNotFoundError):
+        find_archive(str(day), "ec2")
+    with pytest.raises(FileNotFoundError):
+        find_archive(str(day), "rds")